@@ -1,24 +1,50 @@
-from flask import flash, redirect, render_template, request, session, url_for
+from flask import flash, get_template_attribute, redirect, render_template, request, session, url_for
 import time
 import os
+from collections import namedtuple
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from threading import Lock, Thread
+from datetime import datetime
 from sqlalchemy import func, desc, or_
-from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import OperationalError
 from werkzeug.security import check_password_hash, generate_password_hash
-from helpers import login_required, get_league_table, get_valid_matches, convert_iso_datetime_to_human_readable, get_insights, process_predictions, update_live_matches_and_scores, find_closest_in_time_match, update_matches_and_scores, find_matchday_to_display_tippen, delete_user_and_predictions, get_matches_by_gameround, get_game_rounds, get_current_game_round, get_filtered_predictions_by_date, find_closest_in_time_match_from_selection, get_vote_counts
-from models import User, Prediction, Match, UserVote
+from helpers import login_required, admin_required, get_league_table, get_valid_matches, convert_iso_datetime_to_human_readable, get_insights, process_predictions, update_live_matches_and_scores, find_closest_in_time_match, update_matches_and_scores, delete_user_and_predictions, get_matches_by_gameround, get_game_rounds, get_current_game_round, find_closest_in_time_match_from_selection, get_vote_counts, get_prediction_matrix, find_live_matches, find_next_kickoff, rename_user_stats_leader, refresh_user_stats, get_round_points, get_user_predictions_by_match
+from models import User, Match, UserVote
 from config import app, get_db_session
-import csv
+from static_assets import register_static_assets
+from logo_sprites import register_team_logo_sprites
+from query_stats import register_query_stats
+from metrics import register_metrics, track_background_update
+from tracing import get_recent_traces
+from worker_lock import WorkerLock, try_lock
+from render_cache import get_cached_view, get_data_version, bump_data_version, replace_user_row, get_user_predictions_version, make_etag, get_last_modified, conditional_response
 import re
 
 
+# User columns of a cached leaderboard row, plain data instead of a User shared between requests
+RanglisteUser = namedtuple("RanglisteUser", ["id", "username", "total_points"])
+
+
 def is_valid_email(email):
     email_pattern = r"^[^\s@]+@[^\s@]+\.[^\s@]+$"
     return bool(re.match(email_pattern, email))
 
 
+# Fingerprinted, long-cached URLs for the static files (asset_url in the templates)
+register_static_assets(app)
+register_team_logo_sprites(app)
+
+# Number and time of the SQL statements per request in the X-DB-Queries and Server-Timing headers
+register_query_stats(app)
+
+# Request latency, DB pool, OpenLigaDB and sync metrics at /metrics
+register_metrics(app)
+
+
+# Named locks shared by all worker processes, see worker_lock.py
+UPDATE_WORKER_LOCK_NAME = "tippspiel_update"
+LIVE_POLLER_WORKER_LOCK_NAME = "tippspiel_live_poller"
+
 UPDATE_EXECUTOR = ThreadPoolExecutor(max_workers=1)
 UPDATE_LOCK = Lock()
 UPDATE_STATE_LOCK = Lock()
@@ -28,9 +54,14 @@ LAST_UPDATE_QUEUE_TIME = 0.0
 
 def _run_full_update_in_background():
     try:
-        with app.app_context():
-            with get_db_session() as background_db_session:
-                update_matches_and_scores(background_db_session)
+        with try_lock(UPDATE_WORKER_LOCK_NAME) as acquired:
+            # Another worker is updating right now, its results are shared
+            if not acquired:
+                return
+
+            with app.app_context():
+                with get_db_session() as background_db_session, track_background_update("full"):
+                    update_matches_and_scores(background_db_session)
     except Exception as e:
         app.logger.error(f"Background update failed: {e}")
 
@@ -61,12 +92,99 @@ def queue_background_update(min_interval_seconds=UPDATE_MIN_INTERVAL_SECONDS):
     return True
 
 
+LIVE_POLL_ENABLED = os.getenv("LIVE_POLL_ENABLED", "1") == "1"
+LIVE_POLL_INTERVAL_SECONDS = 30
+LIVE_POLL_IDLE_INTERVAL_SECONDS = 300
+LIVE_POLLER_LOCK = Lock()
+LIVE_POLLER_THREAD = None
+
+
+def _poll_live_matches_once():
+    """Run one live update if matches are underway.
+
+    Returns the number of seconds to wait until the next poll.
+    """
+    with app.app_context():
+        with get_db_session() as db_session:
+            if not find_live_matches(db_session):
+                # Sleep until the next kickoff, but never longer than the idle interval
+                next_kickoff = find_next_kickoff(db_session)
+                if next_kickoff:
+                    seconds_to_kickoff = (next_kickoff - datetime.now()).total_seconds()
+                    return max(LIVE_POLL_INTERVAL_SECONDS, min(seconds_to_kickoff, LIVE_POLL_IDLE_INTERVAL_SECONDS))
+                return LIVE_POLL_IDLE_INTERVAL_SECONDS
+
+            # Skip this tick if a full update is already running (in any worker), it refreshes the live matches too
+            if not UPDATE_LOCK.acquire(blocking=False):
+                return LIVE_POLL_INTERVAL_SECONDS
+
+            try:
+                with try_lock(UPDATE_WORKER_LOCK_NAME) as acquired:
+                    if acquired:
+                        with track_background_update("live"):
+                            update_live_matches_and_scores(db_session)
+            finally:
+                UPDATE_LOCK.release()
+
+            return LIVE_POLL_INTERVAL_SECONDS
+
+
+def _live_poll_loop():
+    # Only the worker holding the poller lock polls, the others check from time to time
+    # whether they have to take over, e. g. because that worker was restarted
+    poller_lock = WorkerLock(LIVE_POLLER_WORKER_LOCK_NAME)
+
+    while True:
+        try:
+            if poller_lock.acquire():
+                wait_seconds = _poll_live_matches_once()
+            else:
+                wait_seconds = LIVE_POLL_IDLE_INTERVAL_SECONDS
+        except Exception as e:
+            app.logger.error(f"Live poll failed: {e}")
+            wait_seconds = LIVE_POLL_INTERVAL_SECONDS
+
+        time.sleep(wait_seconds)
+
+
+def start_live_poller():
+    """Start the live-score poller thread of this process if it isn't running yet.
+
+    Every worker starts the thread, but only one of them polls at a time.
+
+    Returns True if the poller was started, otherwise False.
+    """
+    global LIVE_POLLER_THREAD
+
+    if not LIVE_POLL_ENABLED:
+        return False
+
+    if LIVE_POLLER_THREAD is not None and LIVE_POLLER_THREAD.is_alive():
+        return False
+
+    with LIVE_POLLER_LOCK:
+        if LIVE_POLLER_THREAD is not None and LIVE_POLLER_THREAD.is_alive():
+            return False
+
+        LIVE_POLLER_THREAD = Thread(target=_live_poll_loop, name="live-poller", daemon=True)
+        LIVE_POLLER_THREAD.start()
+
+    return True
+
+
+@app.before_request
+def before_request():
+    """Make sure live scores are polled independently of the requests"""
+    start_live_poller()
+
+
 @app.after_request
 def after_request(response):
-    """Ensure responses aren't cached"""
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
+    """Ensure responses aren't cached, unless the view set its own caching policy"""
+    if "Cache-Control" not in response.headers:
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        response.headers["Expires"] = 0
+        response.headers["Pragma"] = "no-cache"
     return response
 
 
@@ -75,6 +193,13 @@ def after_request(response):
 def archive():
     return render_template("apology.html")
 
+
+@app.route("/admin/traces", methods=["GET"])
+@admin_required
+def admin_traces():
+    # Spans of the last updates run by this worker process, newest first
+    return render_template("admin_traces.html", traces=get_recent_traces())
+
 @app.route("/", methods=["GET", "POST"])
 @login_required
 def home():
@@ -124,63 +249,71 @@ def home():
 def rangliste_gesamt():
     try:
         with get_db_session() as db_session:
-            # Hole die Spielrunden
-            game_rounds = get_game_rounds()  # Liefert eine Liste von 5 Tupeln
-            num_rounds = len(game_rounds)
-
-            # Dictionaries zur Speicherung der Punkte:
-            # round_points: { Runde (1-indexed): { user_id: Punkte in dieser Runde } }
-            # total_points: { user_id: Summe aller Punkte über alle Runden }
-            round_points = {}
-            total_points = {}
-
-            # Für jede Spielrunde (Index 0 bis num_rounds-1)
-            for round_index in range(num_rounds):
-                # Hole alle Vorhersagen für diese Runde
-                predictions = get_filtered_predictions_by_date(db_session, round_index)
-                points_this_round = {}
-                for pred in predictions:
-                    points_this_round[pred.user_id] = points_this_round.get(pred.user_id, 0) + pred.points
-                # Runde als 1-indexierte Zahl speichern
-                round_points[round_index + 1] = points_this_round
-
-                # Addiere zu den Gesamtpunkten
-                for user_id, pts in points_this_round.items():
-                    total_points[user_id] = total_points.get(user_id, 0) + pts
-
-            # Hole alle Nutzer (alternativ nur die, die in mindestens einer Runde getippt haben)
-            users = db_session.query(User).all()
-            # Sortiere die Nutzer absteigend nach ihren Gesamtpunkten (default 0, wenn kein Tipp)
-            sorted_users = sorted(users, key=lambda u: total_points.get(u.id, 0), reverse=True)
-
-            # Für jede Runde: Ermittle den Höchstwert, um diesen im Template hervorzuheben
-            max_round_scores = {}
-            for round_num, points_dict in round_points.items():
-                if points_dict:
-                    max_round_scores[round_num] = max(points_dict.values())
-                else:
-                    max_round_scores[round_num] = 0
-
-            # Optional: Gesamthöchste Punktzahl (kann zur Hervorhebung der Gesamtspitze genutzt werden)
-            overall_top = max(total_points.values(), default=0)
-
             # Current round
             current_round = get_current_game_round()
 
-            # Letzter Update-Zeitpunkt der Matches (optional)
-            last_update = db_session.query(func.max(Match.evaluation_Date)).scalar()
-            last_update = convert_iso_datetime_to_human_readable(last_update) if last_update else None
-
-            return render_template("rangliste_gesamt.html",
-                                   users=sorted_users,
-                                   round_points=round_points,
-                                   total_points=total_points,
-                                   max_round_scores=max_round_scores,
-                                   overall_top=overall_top,
-                                   num_rounds=num_rounds,
-                                   user_id=session["user_id"],
-                                   current_round=current_round,
-                                   last_update=last_update)
+            def render_rangliste_gesamt():
+                # Hole die Spielrunden
+                game_rounds = get_game_rounds()  # Liefert eine Liste von 5 Tupeln
+                num_rounds = len(game_rounds)
+
+                # Dictionaries zur Speicherung der Punkte:
+                # round_points: { Runde (1-indexed): { user_id: Punkte in dieser Runde } }
+                # total_points: { user_id: Summe aller Punkte über alle Runden }
+                # Abgeschlossene Runden kommen aus round_results, nur offene Runden werden live aggregiert
+                round_points = get_round_points(db_session)
+                total_points = {}
+
+                # Addiere zu den Gesamtpunkten
+                for points_this_round in round_points.values():
+                    for user_id, pts in points_this_round.items():
+                        total_points[user_id] = total_points.get(user_id, 0) + pts
+
+                # Hole alle Nutzer (alternativ nur die, die in mindestens einer Runde getippt haben)
+                users = db_session.query(User.id, User.username).all()
+                # Sortiere die Nutzer absteigend nach ihren Gesamtpunkten (default 0, wenn kein Tipp)
+                sorted_users = sorted(users, key=lambda u: total_points.get(u.id, 0), reverse=True)
+
+                # Für jede Runde: Ermittle den Höchstwert, um diesen im Template hervorzuheben
+                max_round_scores = {}
+                for round_num, points_dict in round_points.items():
+                    if points_dict:
+                        max_round_scores[round_num] = max(points_dict.values())
+                    else:
+                        max_round_scores[round_num] = 0
+
+                # Optional: Gesamthöchste Punktzahl (kann zur Hervorhebung der Gesamtspitze genutzt werden)
+                overall_top = max(total_points.values(), default=0)
+
+                # Letzter Update-Zeitpunkt der Matches (optional)
+                last_update = db_session.query(func.max(Match.evaluation_Date)).scalar()
+                last_update = convert_iso_datetime_to_human_readable(last_update) if last_update else None
+
+                # Ohne aktuellen Nutzer gerendert, die eigene Zeile wird pro Request hervorgehoben
+                return render_template("rangliste_gesamt.html",
+                                       users=sorted_users,
+                                       round_points=round_points,
+                                       total_points=total_points,
+                                       max_round_scores=max_round_scores,
+                                       overall_top=overall_top,
+                                       num_rounds=num_rounds,
+                                       user_id=None,
+                                       current_round=current_round,
+                                       last_update=last_update)
+
+            # Seiten mit ausstehenden Flash-Nachrichten werden nicht gecacht
+            if session.get("_flashes"):
+                return replace_user_row(render_rangliste_gesamt(), session["user_id"])
+
+            data_version = get_data_version(db_session)
+            cache_key = ("rangliste_gesamt", current_round, data_version)
+
+            def render_page():
+                return replace_user_row(get_cached_view(cache_key, render_rangliste_gesamt), session["user_id"])
+
+            return conditional_response(make_etag(cache_key, session["user_id"]),
+                                        get_last_modified(*data_version[1:4]),
+                                        render_page)
     except OperationalError as e:
         app.logger.error(f"Database connection error: {e}")
         return "Database connection error, please try again later.", 500
@@ -200,68 +333,99 @@ def rangliste():
                 session['matchday_to_display'] = game_round_to_display
             else:
                 game_round_to_display = session.get('matchday_to_display')
-                    
-            # Determine next and previous matchdays
-            current_matchday = game_round_to_display
-            next_matchday = game_round_to_display + 1 if current_matchday + 1 <= len(game_rounds_list) else None
-            prev_matchday = game_round_to_display - 1 if current_matchday > 0 else None
 
-            # Get last update time for display
-            last_update = db_session.query(func.max(Match.evaluation_Date)).scalar()
-            last_update = convert_iso_datetime_to_human_readable(last_update) if last_update else None
-
-            # Update live matches for live scoring
-            update_live_matches_and_scores(db_session)
-            
-            # Fetch all users sorted by multiple criteria
-            users = db_session.query(User).options(
-                joinedload(User.predictions)  # Ensures predictions are loaded with users
-            ).order_by(
-                desc(User.total_points),
-                desc(User.correct_result),
-                desc(User.correct_goal_diff),
-                desc(User.correct_tendency)
-            ).all()
-
-            # Fetch matches and predictions for the current matchday
-            filtered_matches = get_matches_by_gameround(db_session, game_round_to_display - 1)
-            filtered_predictions = get_filtered_predictions_by_date(db_session, game_round_to_display - 1)
-
-            # Calculate user points for the matchday
-            user_points_matchday = {user.id: 0 for user in users}
-            for prediction in filtered_predictions:
-                user_points_matchday[prediction.user_id] += prediction.points
-
-            # Determine top users to highlight in the html
-            max_points = max(user_points_matchday.values(), default=0)
-            top_users = [user_id for user_id, points in user_points_matchday.items() if points == max_points and max_points != 0]
+            # Fetch matches for the current matchday, from the snapshot matching the data version
+            data_version = get_data_version(db_session)
+            filtered_matches = get_matches_by_gameround(db_session, game_round_to_display - 1, data_version)
 
             # Get index of closest in time match to set the default match to display (esp. important for mobile view)
             match_ids = [match.id for match in filtered_matches]
             index_of_closest_in_time_match = match_ids.index(find_closest_in_time_match_from_selection(filtered_matches).id) + 1 # +1 because loop index in jinja starts at 1
-            
-            # Needed for the in-table pagination 
-            no_filtered_matches = len(match_ids)
-
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            print("Match to display: ", index_of_closest_in_time_match)
-            print(f"Elapsed time for Rangliste: {elapsed_time:.4f} seconds")
-                        
-            return render_template("rangliste.html",
-                                matches=filtered_matches,
-                                prev_matchday=prev_matchday,
-                                next_matchday=next_matchday,
-                                current_matchday=current_matchday,
-                                matchdays=[1,2,3,4,5],
-                                users=users,
-                                user_id=session["user_id"],
-                                last_update=last_update,
-                                top_users=top_users,
-                                user_points_matchday=user_points_matchday,
-                                index_of_closest_in_time_match=index_of_closest_in_time_match,
-                                no_matches=no_filtered_matches
-                                )
+
+            # Predictions of other users are revealed at kickoff, so the page also changes with the number of started matches
+            no_kicked_off_matches = sum(1 for match in filtered_matches if match.matchDateTime <= datetime.now())
+
+            def render_rangliste():
+                # Determine next and previous matchdays
+                current_matchday = game_round_to_display
+                next_matchday = game_round_to_display + 1 if current_matchday + 1 <= len(game_rounds_list) else None
+                prev_matchday = game_round_to_display - 1 if current_matchday > 0 else None
+
+                # Get last update time for display
+                last_update = db_session.query(func.max(Match.evaluation_Date)).scalar()
+                last_update = convert_iso_datetime_to_human_readable(last_update) if last_update else None
+
+                # Fetch all users sorted by multiple criteria
+                users = db_session.query(User).order_by(
+                    desc(User.total_points),
+                    desc(User.correct_result),
+                    desc(User.correct_goal_diff),
+                    desc(User.correct_tendency)
+                ).all()
+
+                # Pack the predictions for the matches into a user x match matrix
+                prediction_matrix, user_points_matchday = get_prediction_matrix(db_session, users, filtered_matches)
+
+                # Determine top users to highlight in the html
+                max_points = max(user_points_matchday, default=0)
+                top_users = [user.id for user, points in zip(users, user_points_matchday) if points == max_points and max_points != 0]
+
+                # Rendered without a current user, the user's own row is added per request
+                html = render_template("rangliste.html",
+                                    matches=filtered_matches,
+                                    prev_matchday=prev_matchday,
+                                    next_matchday=next_matchday,
+                                    current_matchday=current_matchday,
+                                    matchdays=[1,2,3,4,5],
+                                    users=users,
+                                    user_id=None,
+                                    last_update=last_update,
+                                    top_users=top_users,
+                                    prediction_matrix=prediction_matrix,
+                                    user_points_matchday=user_points_matchday,
+                                    index_of_closest_in_time_match=index_of_closest_in_time_match,
+                                    no_matches=len(match_ids)
+                                    )
+
+                rows = {user.id: (rank, RanglisteUser(user.id, user.username, user.total_points), points, user.id in top_users)
+                        for rank, (user, points) in enumerate(zip(users, user_points_matchday), start=1)}
+
+                return {"html": html, "rows": rows}
+
+            user_id = session["user_id"]
+            cache_key = ("rangliste", game_round_to_display, data_version,
+                         no_kicked_off_matches, index_of_closest_in_time_match)
+
+            def render_page():
+                # Pending flash messages are rendered into the page, such pages are never cached
+                if session.get("_flashes"):
+                    page = render_rangliste()
+                else:
+                    page = get_cached_view(cache_key, render_rangliste)
+
+                # Render the current user's row with all of their own predictions visible
+                html = page["html"]
+                if user_id in page["rows"]:
+                    rank, user, points, is_top_user = page["rows"][user_id]
+                    own_predictions, _ = get_prediction_matrix(db_session, [user], filtered_matches)
+                    user_row = get_template_attribute("rangliste_row.html", "user_row")
+                    html = replace_user_row(html, user_id, str(user_row(rank, user, own_predictions[0], filtered_matches, points, is_top_user, True)))
+
+                end_time = time.time()
+                elapsed_time = end_time - start_time
+                print("Match to display: ", index_of_closest_in_time_match)
+                print(f"Elapsed time for Rangliste: {elapsed_time:.4f} seconds")
+
+                return html
+
+            if request.method != "GET" or session.get("_flashes"):
+                return render_page()
+
+            # The page also shows the user's own predictions, which only they can change
+            predictions_version = get_user_predictions_version(db_session, user_id, match_ids)
+            return conditional_response(make_etag(cache_key, user_id, tuple(predictions_version)),
+                                        get_last_modified(*data_version[1:4], predictions_version[2]),
+                                        render_page)
         
     except OperationalError as e:
         app.logger.error(f"Database connection error: {e}")
@@ -281,7 +445,8 @@ def tippen():
                 game_round_to_display = session.get('matchday_to_display')
 
             # Get matches for the gameround that should be displayed
-            matches_game_round = get_matches_by_gameround(db_session, game_round_to_display - 1)
+            data_version = get_data_version(db_session)
+            matches_game_round = get_matches_by_gameround(db_session, game_round_to_display - 1, data_version)
 
             # Filter valid matches for predictions
             valid_matches = get_valid_matches(matches_game_round)
@@ -295,19 +460,32 @@ def tippen():
             if request.method == "POST":
                 process_predictions(valid_matches, session, db_session, request)
 
-            # Fetch all predictions for the current user
-            predictions = db_session.query(Prediction).filter_by(user_id=session["user_id"]).all()
+            match_ids = [match.id for match in matches_game_round]
+
+            def render_tippen():
+                # Fetch the user's predictions for the matches on display, keyed by match id
+                predictions = get_user_predictions_by_match(db_session, session["user_id"], match_ids)
+
+                # Get time of last match update
+                last_update = db_session.query(func.max(Match.lastUpdateDateTime)).scalar()
+
+                # Format last update time for display
+                if last_update:
+                    last_update = convert_iso_datetime_to_human_readable(last_update)
+
+                return render_template('tippen.html', matches=matches_game_round, matchdays=[1,2,3,4,5], current_matchday=current_matchday,
+                                    next_matchday=next_matchday, prev_matchday=prev_matchday, last_update=last_update,
+                                    predictions=predictions, valid_match_ids={match.id for match in valid_matches}, matches_by_date=None)
 
-            # Get time of last match update
-            last_update = db_session.query(func.max(Match.lastUpdateDateTime)).scalar()
+            if request.method != "GET" or session.get("_flashes"):
+                return render_tippen()
 
-            # Format last update time for display
-            if last_update:
-                last_update = convert_iso_datetime_to_human_readable(last_update)
+            # The page changes with the matches, the user's predictions and the matches still open for predictions
+            predictions_version = get_user_predictions_version(db_session, session["user_id"], match_ids)
+            etag = make_etag("tippen", game_round_to_display, data_version, session["user_id"],
+                             tuple(predictions_version), tuple(match.id for match in valid_matches))
 
-            return render_template('tippen.html', matches=matches_game_round, matchdays=[1,2,3,4,5], current_matchday=current_matchday,
-                                next_matchday=next_matchday, prev_matchday=prev_matchday, last_update=last_update,
-                                predictions=predictions, valid_matches=valid_matches, matches_by_date=None)
+            return conditional_response(etag, get_last_modified(*data_version[1:4], predictions_version[2]), render_tippen)
         
     except OperationalError as e:
         app.logger.error(f"Database connection error: {e}")
@@ -319,29 +497,42 @@ def tippen():
 def gruppen():
     try:
         with get_db_session() as db_session:
-            table_data = get_league_table(db_session)
-            groups = {}
+            data_version = get_data_version(db_session)
 
-            for team in table_data:
-                if team.teamGroupName not in groups:
-                    groups[team.teamGroupName] = []
+            def render_gruppen():
+                table_data = get_league_table(db_session, data_version)
+                groups = {}
 
-                groups[team.teamGroupName].append(team)
+                for team in table_data:
+                    if team.teamGroupName not in groups:
+                        groups[team.teamGroupName] = []
 
-            try:
-                del groups["None"]  # To remove the placeholder team
-            except KeyError:
-                pass
+                    groups[team.teamGroupName].append(team)
 
-            groups = dict(sorted(groups.items()))
+                try:
+                    del groups["None"]  # To remove the placeholder team
+                except KeyError:
+                    pass
 
-            last_update = table_data[0].lastUpdateTime
-            if last_update:
-                last_update = convert_iso_datetime_to_human_readable(last_update)
-            else:
-                last_update = None
+                groups = dict(sorted(groups.items()))
+
+                last_update = table_data[0].lastUpdateTime
+                if last_update:
+                    last_update = convert_iso_datetime_to_human_readable(last_update)
+                else:
+                    last_update = None
 
-            return render_template("gruppen.html", groups=groups, table_data=table_data, last_update=last_update)
+                return render_template("gruppen.html", groups=groups, table_data=table_data, last_update=last_update)
+
+            # Pending flash messages are rendered into the page, such pages are never cached
+            if session.get("_flashes"):
+                return render_gruppen()
+
+            cache_key = ("gruppen", data_version)
+
+            return conditional_response(make_etag(cache_key),
+                                        get_last_modified(*data_version[1:4]),
+                                        lambda: get_cached_view(cache_key, render_gruppen))
     except OperationalError as e:
         app.logger.error(f"Database connection error: {e}")
         return "Database connection error, please try again later.", 500
@@ -549,7 +740,9 @@ def change_username():
 
                 # Update the user's username in the database
                 user.username = new_username
+                bump_data_version(db_session)
                 db_session.commit()
+                rename_user_stats_leader(db_session, session["username"], new_username)
                 session["username"] = new_username
 
                 flash('Benutzernamen erfolgreich geändert.', 'success')
@@ -672,6 +865,9 @@ def register():
                 db_session.add(new_user)
                 db_session.commit()
 
+                # Create the statistics row of the new user (the other users only get the new number of users)
+                refresh_user_stats(db_session, {new_user.id})
+
                 # Show success message
                 flash("Erfolgreich registriert!", 'success')
 
@@ -724,9 +920,8 @@ def italian_brain_rot():
     try:
         for filename in os.listdir(images_folder):
             if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                # Der URL-Pfad muss relativ zum static-Ordner angegeben werden
-                image_url = url_for('static', filename=f'italian_brain_rot/{filename}')
-                images.append(image_url)
+                # Der Pfad relativ zum static-Ordner, die URL erzeugt asset_url im Template
+                images.append(f'italian_brain_rot/{filename}')
     except Exception as e:
         app.logger.error(f"Fehler beim Auslesen der Bilder für Italian Brain Rot: {e}")
     
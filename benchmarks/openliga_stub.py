@@ -0,0 +1,408 @@
+"""Local stand-in for the OpenLigaDB API.
+
+Serves season fixtures (recorded from the API or generated) and replays them on an
+accelerated clock: matches kick off, goals are scored at their minute, matchIsFinished
+flips after the final whistle and lastUpdateDateTime changes with every event. Point
+the app at it with OPENLIGA_BASE_URL to run the sync and live updates offline.
+
+    python benchmarks/openliga_stub.py record fixtures.json               # needs network access
+    python benchmarks/openliga_stub.py generate fixtures.json --matches 40
+    python benchmarks/openliga_stub.py serve fixtures.json --speed 60 --latency-ms 80 --error-rate 0.05
+    OPENLIGA_BASE_URL=http://127.0.0.1:8765 flask run
+
+The replay clock starts --start (default: shortly before the next kickoff of the fixtures,
+or before the last one if they are all in the past) and runs --speed times faster than
+real time. All times are served on the real clock, so the app sees the matches kick off,
+run and finish while the replay goes on. /_stub/status shows the replay clock and the
+real time of every kickoff, goal and final whistle, e. g. to measure the scoring lag.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_FOLDER))
+
+
+DEFAULT_PORT = 8765
+RECORD_BASE_URL = "https://api.openligadb.de"
+
+HALF_TIME_MINUTE = 45
+HALF_TIME_BREAK = timedelta(minutes=15)
+MATCH_DURATION = timedelta(minutes=110)     # Kickoff until the final whistle, including the break
+START_BEFORE_KICKOFF = timedelta(minutes=5)
+
+
+def parse_datetime(value):
+    # The API sends local times without offset, recorded UTC values are made naive as well
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def format_datetime(value):
+    return value.replace(microsecond=0).isoformat()
+
+
+def get_final_score(match):
+    results = match.get("matchResults") or []
+    if not results:
+        return None
+
+    final = max(results, key=lambda result: result["resultOrderID"])
+    return final["pointsTeam1"], final["pointsTeam2"]
+
+
+def get_goals(match):
+    """Return the goals of a match as (minute, score team 1, score team 2).
+
+    Recorded goals are used as they are. Otherwise goals are made up (always the same
+    per match) for the final score, or for a random score if the match isn't played yet.
+    """
+    recorded_goals = [goal for goal in match.get("goals") or [] if goal.get("matchMinute") is not None]
+    if recorded_goals:
+        return sorted((goal["matchMinute"], goal["scoreTeam1"], goal["scoreTeam2"]) for goal in recorded_goals)
+
+    rnd = random.Random(match["matchID"])
+    final_score = get_final_score(match) if match.get("matchIsFinished") else None
+    team1_goals, team2_goals = final_score or (rnd.randint(0, 3), rnd.randint(0, 3))
+
+    scorers = [1] * team1_goals + [2] * team2_goals
+    rnd.shuffle(scorers)
+    minutes = sorted(rnd.randint(1, 90) for _ in scorers)
+
+    goals = []
+    score = [0, 0]
+    for minute, scorer in zip(minutes, scorers):
+        score[scorer - 1] += 1
+        goals.append((minute, score[0], score[1]))
+
+    return goals
+
+
+def get_goal_time(kickoff, minute):
+    if minute > HALF_TIME_MINUTE:
+        return kickoff + timedelta(minutes=minute) + HALF_TIME_BREAK
+    return kickoff + timedelta(minutes=minute)
+
+
+class Replay:
+    """Accelerated clock over the fixtures"""
+
+    def __init__(self, fixtures, speed=60.0, start=None):
+        self.fixtures = fixtures
+        self.speed = speed
+        self.matches = [match for league in fixtures["matches"].values() for match in league]
+        self.goals = {match["matchID"]: get_goals(match) for match in self.matches}
+        self.virtual_start = start or self.get_default_start()
+        self.started_at = datetime.now()
+
+    def get_default_start(self):
+        kickoffs = sorted(parse_datetime(match["matchDateTime"]) for match in self.matches)
+        now = datetime.now()
+        next_kickoff = next((kickoff for kickoff in kickoffs if kickoff >= now), kickoffs[-1])
+        return next_kickoff - START_BEFORE_KICKOFF
+
+    def virtual_now(self):
+        return self.virtual_start + (datetime.now() - self.started_at) * self.speed
+
+    def to_real(self, virtual_time):
+        return self.started_at + (virtual_time - self.virtual_start) / self.speed
+
+    def get_match(self, match, now=None):
+        """The match as the API would send it at the (virtual) time now"""
+        now = now or self.virtual_now()
+        kickoff = parse_datetime(match["matchDateTime"])
+        served = copy.deepcopy(match)
+        served["matchDateTime"] = format_datetime(self.to_real(kickoff))
+        served.pop("matchDateTimeUTC", None)
+
+        if now < kickoff:
+            served["matchIsFinished"] = False
+            served["matchResults"] = []
+            served["goals"] = []
+            # Like the API, never a time in the future
+            served["lastUpdateDateTime"] = format_datetime(self.to_real(min(kickoff - timedelta(days=1), self.virtual_start)))
+            return served
+
+        finished = now >= kickoff + MATCH_DURATION
+        goals = [goal for goal in self.goals[match["matchID"]] if finished or get_goal_time(kickoff, goal[0]) <= now]
+        score = goals[-1][1:] if goals else (0, 0)
+        half_time_goals = [goal for goal in goals if goal[0] <= HALF_TIME_MINUTE]
+        half_time_score = half_time_goals[-1][1:] if half_time_goals else (0, 0)
+
+        served["matchIsFinished"] = finished
+        served["matchResults"] = [
+            {"resultOrderID": 1, "resultName": "Halbzeit", "pointsTeam1": half_time_score[0], "pointsTeam2": half_time_score[1]},
+            {"resultOrderID": 2, "resultName": "Endergebnis", "pointsTeam1": score[0], "pointsTeam2": score[1]},
+        ]
+        served["goals"] = [
+            {"goalID": index + 1, "matchMinute": minute, "scoreTeam1": team1_score, "scoreTeam2": team2_score}
+            for index, (minute, team1_score, team2_score) in enumerate(goals)
+        ]
+
+        last_event = kickoff
+        if goals:
+            last_event = get_goal_time(kickoff, goals[-1][0])
+        if finished:
+            last_event = kickoff + MATCH_DURATION
+        served["lastUpdateDateTime"] = format_datetime(self.to_real(last_event))
+
+        return served
+
+    def get_league_matches(self, league, team=None):
+        now = self.virtual_now()
+        matches = self.fixtures["matches"].get(league, [])
+
+        if team:
+            team = team.lower()
+            matches = [match for match in matches if any(
+                team in match[side].get("teamName", "").lower() for side in ("team1", "team2"))]
+
+        return [self.get_match(match, now) for match in matches]
+
+    def find_match(self, match_id):
+        return next((self.get_match(match) for match in self.matches if match["matchID"] == match_id), None)
+
+    def get_current_group(self, league):
+        # The matchday of the first match of the league that isn't finished yet, else the last one
+        matches = sorted(self.fixtures["matches"].get(league, []), key=lambda match: match["matchDateTime"])
+        if not matches:
+            return None
+
+        now = self.virtual_now()
+        current = next((match for match in matches
+                        if parse_datetime(match["matchDateTime"]) + MATCH_DURATION > now), matches[-1])
+        return current["group"]
+
+    def get_last_change(self, league, matchday):
+        updates = [match["lastUpdateDateTime"] for match in self.get_league_matches(league)
+                   if match["group"]["groupOrderID"] == matchday]
+        return max(updates) if updates else None
+
+    def get_status(self):
+        """Replay clock and the real time of every event of the matches"""
+        timeline = []
+        for match in self.matches:
+            kickoff = parse_datetime(match["matchDateTime"])
+            events = [("kickoff", kickoff, None)]
+            events += [("goal", get_goal_time(kickoff, minute), f"{score1}:{score2}")
+                       for minute, score1, score2 in self.goals[match["matchID"]]]
+            events.append(("finished", kickoff + MATCH_DURATION, None))
+
+            for event, virtual_time, score in events:
+                timeline.append({"matchID": match["matchID"], "event": event, "score": score,
+                                 "time": format_datetime(self.to_real(virtual_time))})
+
+        timeline.sort(key=lambda event: event["time"])
+
+        return {
+            "virtual_now": format_datetime(self.virtual_now()),
+            "virtual_start": format_datetime(self.virtual_start),
+            "started_at": format_datetime(self.started_at),
+            "speed": self.speed,
+            "timeline": timeline,
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Set by make_server()
+    replay = None
+    options = None
+    random = random.Random()
+    random_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def inject_faults(self):
+        """Sleep for the latency and maybe fail the request, return True if it was answered."""
+        with self.random_lock:
+            latency = self.options.latency_ms + self.random.uniform(0, self.options.jitter_ms)
+            roll = self.random.random()
+
+        time.sleep(latency / 1000)
+
+        if roll < self.options.timeout_rate:
+            # Longer than the client's timeout
+            time.sleep(self.options.hang_seconds)
+            self.send_json({"error": "injected timeout"}, status=504)
+            return True
+
+        if roll < self.options.timeout_rate + self.options.error_rate:
+            self.send_json({"error": "injected error"}, status=503)
+            return True
+
+        return False
+
+    def do_GET(self):
+        parts = [unquote(part) for part in urlsplit(self.path).path.strip("/").split("/") if part]
+
+        if parts[:2] == ["_stub", "status"]:
+            return self.send_json(self.replay.get_status())
+
+        if self.inject_faults():
+            return
+
+        endpoint, arguments = (parts[0], parts[1:]) if parts else ("", [])
+
+        if endpoint == "getmatchdata" and len(arguments) == 1 and arguments[0].isdigit():
+            match = self.replay.find_match(int(arguments[0]))
+            return self.send_json(match) if match else self.send_json(None, status=404)
+
+        if endpoint == "getmatchdata" and len(arguments) >= 2:
+            team = arguments[2] if len(arguments) > 2 else None
+            return self.send_json(self.replay.get_league_matches(arguments[0], team))
+
+        if endpoint == "getavailableteams" and arguments:
+            return self.send_json(self.replay.fixtures["teams"].get(arguments[0], []))
+
+        if endpoint == "getcurrentgroup" and arguments:
+            return self.send_json(self.replay.get_current_group(arguments[0]))
+
+        if endpoint == "getlastchangedate" and len(arguments) == 3 and arguments[2].isdigit():
+            return self.send_json(self.replay.get_last_change(arguments[0], int(arguments[2])))
+
+        self.send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+
+def make_server(replay, options):
+    handler = type("ReplayStubHandler", (StubHandler,), {"replay": replay, "options": options})
+    return ThreadingHTTPServer((options.host, options.port), handler)
+
+
+def load_fixtures(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_fixtures(fixtures, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, indent=1, ensure_ascii=False)
+
+
+def record_fixtures(leagues, season, team):
+    """Download the matches and teams of the leagues from the real API"""
+    import requests
+
+    fixtures = {"season": season, "matches": {}, "teams": {}}
+
+    for league in leagues:
+        matches_url = f"{RECORD_BASE_URL}/getmatchdata/{league}/{season}/{team}" if team else f"{RECORD_BASE_URL}/getmatchdata/{league}/{season}"
+        teams_url = f"{RECORD_BASE_URL}/getavailableteams/{league}/{season}"
+
+        for key, url in (("matches", matches_url), ("teams", teams_url)):
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            fixtures[key][league] = response.json()
+
+    return fixtures
+
+
+def generate_fixtures(n_matches, season, seed=1):
+    """Fixtures in the API format for a synthetic season around the current date"""
+    import synthetic_season
+
+    now = datetime.now()
+    rnd = random.Random(seed)
+    teams = synthetic_season.make_teams(20)
+    teams_by_id = {team["id"]: team for team in teams}
+    matches = synthetic_season.make_matches(n_matches, 20, now, rnd)
+
+    fixtures = {"season": season, "matches": {}, "teams": {}}
+
+    for league in ("bl1", "dfb"):
+        matchdata = synthetic_season.make_matchdata(matches, league)
+
+        for match in matchdata:
+            for side in ("team1", "team2"):
+                team = teams_by_id[match[side]["teamId"]]
+                match[side].update({"teamName": team["teamName"], "shortName": team["shortName"], "teamIconUrl": ""})
+
+        fixtures["matches"][league] = matchdata
+        fixtures["teams"][league] = [
+            {"teamId": team["id"], "teamName": team["teamName"], "shortName": team["shortName"],
+             "teamIconUrl": "", "teamGroupName": None}
+            for team in teams
+        ]
+
+    return fixtures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Record fixtures from the OpenLigaDB API")
+    record.add_argument("path")
+    record.add_argument("--leagues", nargs="+", default=["bl1", "dfb"])
+    record.add_argument("--season", default="2025")
+    record.add_argument("--team", default="Heidenheim", help="Only the matches of this team (empty for all)")
+
+    generate = commands.add_parser("generate", help="Generate fixtures for a synthetic season")
+    generate.add_argument("path")
+    generate.add_argument("--matches", type=int, default=40)
+    generate.add_argument("--season", default="2025")
+
+    serve = commands.add_parser("serve", help="Serve and replay fixtures")
+    serve.add_argument("path")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--speed", type=float, default=60.0, help="Replay speed, 60 = a match in under two minutes")
+    serve.add_argument("--start", type=parse_datetime, help="Replay time to start at (fixture time, ISO format)")
+    serve.add_argument("--latency-ms", type=float, default=0.0)
+    serve.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency up to this value")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    serve.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests that hang for --hang-seconds")
+    serve.add_argument("--hang-seconds", type=float, default=15.0)
+    serve.add_argument("--verbose", action="store_true", help="Log every request")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "record":
+        save_fixtures(record_fixtures(args.leagues, args.season, args.team), args.path)
+        print(f"Recorded the fixtures to {args.path}")
+        return 0
+
+    if args.command == "generate":
+        save_fixtures(generate_fixtures(args.matches, args.season), args.path)
+        print(f"Generated the fixtures in {args.path}")
+        return 0
+
+    replay = Replay(load_fixtures(args.path), speed=args.speed, start=args.start)
+    server = make_server(replay, args)
+
+    print(f"OpenLigaDB stub on http://{args.host}:{args.port}, replaying from {format_datetime(replay.virtual_start)} "
+          f"at {args.speed:g}x (set OPENLIGA_BASE_URL=http://{args.host}:{args.port})")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
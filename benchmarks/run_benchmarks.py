@@ -0,0 +1,302 @@
+"""Benchmarks of the hot paths on a synthetic season.
+
+Builds a synthetic season (see synthetic_season.py) in a throwaway SQLite database, or
+in the empty database given with --database-url, and times the routes and the scoring
+and sync functions. Prints p50/p95 and the peak memory (tracemalloc) of every benchmark.
+
+    python benchmarks/run_benchmarks.py --users 3000
+    python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json
+
+With --compare the exit code is 1 if the p95 of a benchmark got slower than the
+baseline by more than --tolerance.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+ROOT_FOLDER = os.path.dirname(BENCHMARKS_FOLDER)
+sys.path.insert(0, ROOT_FOLDER)
+
+import synthetic_season
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--matches", type=int, default=40, help="Matches of the season (bl1 and dfb)")
+    parser.add_argument("--predictions-per-user", type=int, default=36)
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per benchmark")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed runs before the timed ones")
+    parser.add_argument("--only", nargs="*", help="Run only these benchmarks")
+    parser.add_argument("--database-url", help="Empty database to use instead of a temporary SQLite file")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as JSON, e. g. as new baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown against the baseline")
+    return parser.parse_args()
+
+
+def setup_environment(args, work_folder):
+    """Point the app at the benchmark database and calendar. Must run before the app is imported."""
+    database_url = args.database_url or "sqlite:///" + os.path.join(work_folder, "benchmark.sqlite")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SEASON_CALENDAR_PATH"] = os.path.join(work_folder, "season_calendar.json")
+    os.environ["LIVE_POLL_ENABLED"] = "0"
+    os.environ["TRACE_FILE"] = ""
+
+
+def import_app(work_folder):
+    # Flask-Session keeps the session files in the working directory of the import
+    previous_folder = os.getcwd()
+    os.chdir(work_folder)
+    try:
+        import app as app_module
+    finally:
+        os.chdir(previous_folder)
+    return app_module
+
+
+@contextlib.contextmanager
+def quiet():
+    # The app prints progress messages, they would drown the results
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_benchmark(name, benchmark, setup, runs, warmup):
+    """Time benchmark() runs times (setup() before each run is not timed), then measure the peak memory of one run"""
+    for _ in range(warmup):
+        setup()
+        benchmark()
+
+    durations = []
+    for _ in range(runs):
+        setup()
+        gc.collect()
+        start = time.perf_counter()
+        benchmark()
+        durations.append(time.perf_counter() - start)
+
+    setup()
+    gc.collect()
+    tracemalloc.start()
+    benchmark()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "runs": runs,
+        "p50_ms": round(percentile(durations, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(durations, 0.95) * 1000, 3),
+        "mean_ms": round(statistics.mean(durations) * 1000, 3),
+        "min_ms": round(min(durations) * 1000, 3),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def get_benchmarks(app_module, matches):
+    """Return a list of (name, benchmark, setup)"""
+    from flask import session
+    from sqlalchemy import update
+    import helpers
+    from config import app, get_db_session
+    from models import Match
+    from render_cache import render_cache
+
+    user_id = 1
+    client = app.test_client()
+    with client.session_transaction() as client_session:
+        client_session["user_id"] = user_id
+        client_session["username"] = f"player{user_id}"
+
+    def no_setup():
+        pass
+
+    def get(path):
+        def benchmark():
+            response = client.get(path)
+            assert response.status_code == 200, f"{path}: {response.status_code}"
+        return benchmark
+
+    # tippen POST: predictions for all open matches of the current round, alternating scores
+    # so every submission has changes to write
+    now = datetime.now()
+    with app.test_request_context():
+        current_round = helpers.get_current_game_round()
+    start, end = helpers.get_season_calendar(helpers.leagueSeason).get_bounds(current_round)
+    open_matches = [match for match in matches if start <= match["matchDateTime"] < end and match["matchDateTime"] > now]
+    post_counter = [0]
+
+    def post_tippen():
+        post_counter[0] += 1
+        form = {}
+        for match in open_matches:
+            form[f"team1Score_{match['id']}"] = str(post_counter[0] % 4)
+            form[f"team2Score_{match['id']}"] = str((post_counter[0] + 1) % 3)
+
+        with client.session_transaction() as client_session:
+            client_session["matchday_to_display"] = current_round
+            client_session.pop("_flashes", None)
+
+        response = client.post("/tippen", data=form)
+        assert response.status_code == 200, f"/tippen POST: {response.status_code}"
+
+    def get_insights():
+        with app.test_request_context():
+            session["user_id"] = user_id
+            with get_db_session() as db_session:
+                helpers.get_insights(db_session)
+
+    # Scoring: all finished matches are pending again, award_predictions is rolled back after each run
+    def reset_evaluation():
+        with get_db_session() as db_session:
+            db_session.execute(update(Match).where(Match.matchIsFinished == 1).values(predictions_evaluated=0))
+            db_session.commit()
+
+    def award_predictions():
+        with get_db_session() as db_session:
+            helpers.award_predictions(db_session)
+            db_session.rollback()
+
+    def award_users():
+        with get_db_session() as db_session:
+            helpers.award_users(db_session)
+
+    # Match sync: every other run the finished matches have different scores
+    sync_counter = [0]
+
+    def sync_matches():
+        sync_counter[0] += 1
+        matchdata = synthetic_season.make_matchdata(matches, "bl1", score_offset=sync_counter[0] % 2)
+        with get_db_session() as db_session:
+            helpers.insert_or_update_matches_to_db(db_session, "bl1", matchdata)
+
+    return [
+        ("rangliste", get("/rangliste"), render_cache.clear),
+        ("rangliste (cached)", get("/rangliste"), no_setup),
+        ("rangliste_gesamt", get("/rangliste/gesamt"), render_cache.clear),
+        ("tippen GET", get("/tippen"), no_setup),
+        ("tippen POST", post_tippen, no_setup),
+        ("get_insights", get_insights, no_setup),
+        ("award_predictions", award_predictions, reset_evaluation),
+        ("award_users", award_users, no_setup),
+        ("insert_or_update_matches_to_db", sync_matches, no_setup),
+    ]
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """Print the change against the baseline, return the names of the benchmarks that got slower"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    if baseline["meta"]["size"] != results["meta"]["size"]:
+        print(f"Warning: the baseline was measured with {baseline['meta']['size']}, not {results['meta']['size']}")
+
+    regressions = []
+    print(f"\n{'benchmark':34} {'p95 baseline':>14} {'p95 now':>10} {'change':>8}")
+
+    for name, result in results["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            print(f"{name:34} {'-':>14} {result['p95_ms']:>10.2f}")
+            continue
+
+        change = result["p95_ms"] / baseline_result["p95_ms"] - 1 if baseline_result["p95_ms"] else 0.0
+        marker = ""
+        if change > tolerance:
+            regressions.append(name)
+            marker = "  SLOWER"
+
+        print(f"{name:34} {baseline_result['p95_ms']:>14.2f} {result['p95_ms']:>10.2f} {change:>+8.0%}{marker}")
+
+    return regressions
+
+
+def run(args, work_folder):
+    app_module = import_app(work_folder)
+
+    import helpers
+    from config import get_db_session
+    from database_init import init_database
+
+    init_database()
+
+    # The calendar is read on first use, so it can still be written now
+    now = datetime.now()
+    synthetic_season.write_season_calendar(os.environ["SEASON_CALENDAR_PATH"], helpers.leagueSeason, now)
+
+    print(f"Generating a season with {args.users} users, {args.matches} matches and "
+          f"{args.predictions_per_user} predictions per user...")
+
+    with quiet(), get_db_session() as db_session:
+        matches = synthetic_season.generate_season(db_session, args.users, args.matches, args.predictions_per_user, now)
+        helpers.update_user_scores(db_session, reconcile=True)
+
+    results = {
+        "meta": {
+            "created": now.isoformat(timespec="seconds"),
+            "size": {"users": args.users, "matches": args.matches, "predictions_per_user": args.predictions_per_user},
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": {},
+    }
+
+    print(f"\n{'benchmark':34} {'p50 ms':>10} {'p95 ms':>10} {'peak KiB':>10}")
+
+    for name, benchmark, setup in get_benchmarks(app_module, matches):
+        if args.only and name not in args.only:
+            continue
+
+        with quiet():
+            result = run_benchmark(name, benchmark, setup, args.runs, args.warmup)
+
+        results["results"][name] = result
+        print(f"{name:34} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['peak_memory_kib']:>10.1f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved the results to {args.save}")
+
+    if args.compare:
+        regressions = compare_with_baseline(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+
+    return 0
+
+
+def main():
+    args = parse_args()
+    work_folder = tempfile.mkdtemp(prefix="tippspiel-benchmark-")
+
+    try:
+        setup_environment(args, work_folder)
+        return run(args, work_folder)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Synthetic season for the benchmarks.
+
+Fills an empty database with teams, the matches of one club in the Bundesliga (bl1) and
+the DFB-Pokal (dfb), users and their predictions. The season is placed around the
+current date, so there are finished matches to score and open matches to predict, and a
+matching season calendar (five rounds of eight weeks, the current one in the middle) is
+written for SEASON_CALENDAR_PATH.
+
+Also builds OpenLigaDB-style matchdata of the generated matches for the match sync.
+"""
+import json
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+
+
+CLUB_ID = 199
+ROUNDS = 5
+ROUND_LENGTH = timedelta(weeks=8)
+DFB_EVERY_NTH_MATCH = 6     # Every 6th match is a cup match
+
+# Matches at the same time of day, like a regular Saturday kickoff
+KICKOFF_HOUR = 15
+KICKOFF_MINUTE = 30
+
+
+def get_season_start(now):
+    # The current date is in the middle of the third round
+    start = now - ROUNDS * ROUND_LENGTH / 2
+    return datetime(start.year, start.month, start.day)
+
+
+def make_season_calendar(season, now):
+    start = get_season_start(now)
+    rounds = [
+        {"start": (start + index * ROUND_LENGTH).isoformat(), "end": (start + (index + 1) * ROUND_LENGTH).isoformat()}
+        for index in range(ROUNDS)
+    ]
+    return {str(season): rounds}
+
+
+def write_season_calendar(path, season, now):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(make_season_calendar(season, now), f, indent=2)
+
+
+def make_teams(n_opponents):
+    teams = [{"id": CLUB_ID, "teamName": "1. FC Heidenheim 1846", "shortName": "FCH", "teamRank": 1}]
+
+    for index in range(n_opponents):
+        team_id = index + 1
+        teams.append({
+            "id": team_id,
+            "teamName": f"Team {team_id}",
+            "shortName": f"T{team_id}",
+            "teamRank": team_id + 1,
+        })
+
+    for team in teams:
+        team.update({
+            "teamIconPath": f"static/bl1/2025/team-logos/{team['teamName']}.png",
+            "teamGroupName": "None",
+            "lastUpdateTime": datetime(2025, 8, 1),
+        })
+
+    return teams
+
+
+def make_matches(n_matches, n_opponents, now, rnd):
+    """Matches spread evenly over the season, the ones before now are finished"""
+    start = get_season_start(now)
+    interval = ROUNDS * ROUND_LENGTH / n_matches
+    matches = []
+    matchdays = {"bl1": 0, "dfb": 0}
+
+    for index in range(n_matches):
+        day = start + interval * (index + 0.5)
+        kickoff = datetime(day.year, day.month, day.day, KICKOFF_HOUR, KICKOFF_MINUTE)
+        league = "dfb" if index % DFB_EVERY_NTH_MATCH == DFB_EVERY_NTH_MATCH - 1 else "bl1"
+        matchdays[league] += 1
+        opponent = index % n_opponents + 1
+        team1_id, team2_id = (CLUB_ID, opponent) if index % 2 == 0 else (opponent, CLUB_ID)
+        finished = kickoff + timedelta(hours=2) < now
+
+        matches.append({
+            "id": 100000 + index,
+            "matchday": matchdays[league],
+            "team1_id": team1_id,
+            "team2_id": team2_id,
+            "team1_score": rnd.randint(0, 4) if finished else None,
+            "team2_score": rnd.randint(0, 4) if finished else None,
+            "matchDateTime": kickoff,
+            "matchIsFinished": 1 if finished else 0,
+            # Open matches were last changed when the schedule was published
+            "lastUpdateDateTime": kickoff + timedelta(hours=2) if finished else start,
+            "leagueShortcut": league,
+            "groupName": f"{matchdays[league]}. Spieltag" if league == "bl1" else f"{matchdays[league]}. Runde",
+        })
+
+    return matches
+
+
+def make_predictions(user_ids, matches, predictions_per_user, rnd):
+    predictions = []
+    predictions_per_user = min(predictions_per_user, len(matches))
+
+    for user_id in user_ids:
+        for match in rnd.sample(matches, predictions_per_user):
+            team1_score, team2_score = rnd.randint(0, 3), rnd.randint(0, 3)
+            predictions.append({
+                "user_id": user_id,
+                "matchday": match["matchday"],
+                "match_id": match["id"],
+                "team1_score": team1_score,
+                "team2_score": team2_score,
+                "goal_diff": team1_score - team2_score,
+                "winner": 1 if team1_score > team2_score else 2 if team1_score < team2_score else 0,
+                "prediction_date": match["matchDateTime"] - timedelta(days=rnd.randint(1, 14)),
+                "points": 0,
+            })
+
+    return predictions
+
+
+def generate_season(db_session, n_users, n_matches, predictions_per_user, now=None, seed=1, n_opponents=20):
+    """Insert a synthetic season into an empty database.
+
+    Returns the inserted match rows (as dicts).
+    """
+    from models import User, Match, Team, Prediction
+
+    if db_session.query(User.id).first() is not None or db_session.query(Match.id).first() is not None:
+        raise RuntimeError("The benchmark database must be empty, refusing to add a synthetic season")
+
+    now = now or datetime.now()
+    rnd = random.Random(seed)
+
+    matches = make_matches(n_matches, n_opponents, now, rnd)
+    users = [
+        {"id": user_id, "username": f"player{user_id}", "hash": "benchmark", "total_points": 0,
+         "correct_result": 0, "correct_goal_diff": 0, "correct_tendency": 0}
+        for user_id in range(1, n_users + 1)
+    ]
+
+    db_session.execute(insert(Team), make_teams(n_opponents))
+    db_session.execute(insert(Match), matches)
+    db_session.execute(insert(User), users)
+
+    # Inserted in chunks to keep the statements of big seasons small
+    predictions = make_predictions([user["id"] for user in users], matches, predictions_per_user, rnd)
+    for index in range(0, len(predictions), 5000):
+        db_session.execute(insert(Prediction), predictions[index:index + 5000])
+
+    db_session.commit()
+
+    return matches
+
+
+def make_matchdata(matches, league, score_offset=0):
+    """OpenLigaDB matchdata of the generated matches of a league.
+
+    score_offset changes the final scores of the finished matches, so a sync has updates to write.
+    """
+    matchdata = []
+
+    for match in matches:
+        if match["leagueShortcut"] != league:
+            continue
+
+        results = []
+        if match["team1_score"] is not None:
+            team1_score = match["team1_score"] + score_offset
+            results = [
+                {"resultOrderID": 1, "pointsTeam1": 0, "pointsTeam2": 0},
+                {"resultOrderID": 2, "pointsTeam1": team1_score, "pointsTeam2": match["team2_score"]},
+            ]
+
+        matchdata.append({
+            "matchID": match["id"],
+            "matchDateTime": match["matchDateTime"].isoformat(),
+            "group": {"groupOrderID": match["matchday"], "groupName": match["groupName"]},
+            "team1": {"teamId": match["team1_id"]},
+            "team2": {"teamId": match["team2_id"]},
+            "matchIsFinished": bool(match["matchIsFinished"]),
+            "matchResults": results,
+            "lastUpdateDateTime": match["lastUpdateDateTime"].isoformat(),
+        })
+
+    return matchdata
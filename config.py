@@ -1,11 +1,11 @@
 from flask import Flask
 from flask_session import Session
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
 from datetime import timedelta
+from threading import Lock
 import os
-from models import Base
+from metrics import TimedQueuePool, register_pool_metrics
 
 
 app = Flask(__name__)
@@ -20,51 +20,67 @@ app.config["DEBUG"] = os.getenv("FLASK_DEBUG", "0") == "1"
 Session(app)
 
 # SQLAlchemy database URI
-SQLALCHEMY_DATABASE_URI = 'mysql+mysqlconnector://{username}:{password}@{hostname}/{databasename}'.format(
-    username=os.getenv('DB_USERNAME'),
-    password=os.getenv('DB_PASSWORD'),
-    hostname=os.getenv('DB_HOSTNAME'),
-    databasename=os.getenv('DB_DATABASE_FCH2024')
-)
+def get_sqlalchemy_database_uri():
+    # DATABASE_URL replaces the MySQL settings, e. g. sqlite:///bench.sqlite for the benchmarks
+    database_url = os.getenv('DATABASE_URL')
+    if database_url:
+        return database_url
+
+    return 'mysql+mysqlconnector://{username}:{password}@{hostname}/{databasename}'.format(
+        username=os.getenv('DB_USERNAME'),
+        password=os.getenv('DB_PASSWORD'),
+        hostname=os.getenv('DB_HOSTNAME'),
+        databasename=os.getenv('DB_DATABASE_FCH2024')
+    )
+
+SQLALCHEMY_DATABASE_URI = get_sqlalchemy_database_uri()
 
 app.config["SQLALCHEMY_DATABASE_URI"] = SQLALCHEMY_DATABASE_URI
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Create SQLAlchemy engine and session
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URI,
-    poolclass=QueuePool,
-    pool_recycle=280,  # Recycle connections after 280 seconds
-    pool_pre_ping=True  # Enable connection testing
-)
-SessionFactory = sessionmaker(bind=engine)
-session_db = scoped_session(SessionFactory)
+# Connection pool, the defaults fit a single web worker with the background threads
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))     # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 280))    # Recycle connections after 280 seconds
 
-# To create all tables
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
-Session = sessionmaker(bind=engine)
-session = Session()
+# The engine is created on first use, so importing the app makes no database calls.
+# The schema is created and migrated by database_init.py, not at startup.
+_engine = None
+_engine_lock = Lock()
 
-# Create all tables
-Base.metadata.create_all(engine)
+SessionFactory = sessionmaker()
+session_db = scoped_session(SessionFactory)
 
 
-def ensure_users_email_column(engine):
-    inspector = inspect(engine)
-    columns = {column["name"] for column in inspector.get_columns("users")}
+def get_engine():
+    global _engine
 
-    with engine.begin() as connection:
-        if "email" not in columns:
-            connection.execute(text("ALTER TABLE users ADD COLUMN email VARCHAR(255) NULL"))
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    SQLALCHEMY_DATABASE_URI,
+                    poolclass=TimedQueuePool,  # QueuePool that records the checkout wait for /metrics
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=True  # Enable connection testing
+                )
+                register_pool_metrics(engine)
+                SessionFactory.configure(bind=engine)
+                _engine = engine
 
-    inspector = inspect(engine)
-    indexes = {index["name"] for index in inspector.get_indexes("users")}
-    if "ix_user_email" not in indexes:
-        with engine.begin() as connection:
-            connection.execute(text("CREATE UNIQUE INDEX ix_user_email ON users (email)"))
+    return _engine
 
-ensure_users_email_column(engine)
 
 def get_db_session():
+    get_engine()
     return session_db()
 
+
+def new_db_session():
+    # A session of its own instead of the thread's scoped session, close it after use
+    get_engine()
+    return SessionFactory()
@@ -1,13 +1,65 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Base
-from config import get_sqlalchemy_database_uri
+"""Create and migrate the database schema.
 
-SQLALCHEMY_DATABASE_URI = get_sqlalchemy_database_uri()
+Run once after deploying and after model changes, before the workers are (re)started:
 
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
-Session = sessionmaker(bind=engine)
-session = Session()
+    python database_init.py
 
-# Create all tables
-Base.metadata.create_all(engine)
+The app itself doesn't touch the schema at startup. All steps check the current schema
+first, so running this again changes nothing.
+"""
+from sqlalchemy import inspect, text
+from models import Base, DataVersion
+from config import get_engine
+
+
+def ensure_users_email_column(engine):
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns("users")}
+
+    with engine.begin() as connection:
+        if "email" not in columns:
+            connection.execute(text("ALTER TABLE users ADD COLUMN email VARCHAR(255) NULL"))
+
+    inspector = inspect(engine)
+    indexes = {index["name"] for index in inspector.get_indexes("users")}
+    if "ix_user_email" not in indexes:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE UNIQUE INDEX ix_user_email ON users (email)"))
+
+
+def ensure_predictions_unique_key(engine):
+    # Older databases allowed several predictions per user and match, keep only the latest one
+    inspector = inspect(engine)
+    indexes = {index["name"] for index in inspector.get_indexes("predictions")}
+
+    if "uq_prediction_user_match" not in indexes:
+        with engine.begin() as connection:
+            connection.execute(text(
+                "DELETE FROM predictions WHERE id NOT IN ("
+                "SELECT latest_id FROM (SELECT MAX(id) AS latest_id FROM predictions GROUP BY user_id, match_id) AS latest)"
+            ))
+            connection.execute(text("CREATE UNIQUE INDEX uq_prediction_user_match ON predictions (user_id, match_id)"))
+
+
+def ensure_data_version_row(engine):
+    # The single row of the data version counter, see render_cache.py
+    with engine.begin() as connection:
+        if connection.execute(DataVersion.__table__.select()).first() is None:
+            connection.execute(DataVersion.__table__.insert().values(id=1, version=0))
+
+
+def init_database(engine=None):
+    engine = engine or get_engine()
+
+    # Create all tables
+    Base.metadata.create_all(engine)
+
+    # Migrations of existing databases
+    ensure_users_email_column(engine)
+    ensure_predictions_unique_key(engine)
+    ensure_data_version_row(engine)
+
+
+if __name__ == "__main__":
+    init_database()
+    print("Database schema is up to date.")
@@ -1,16 +1,21 @@
-from flask import flash, redirect, session
+from flask import abort, flash, redirect, session
 from flask import current_app as app
-from sqlalchemy import func, text, desc, case, or_, and_
+from sqlalchemy import func, text, desc, case, or_, and_, bindparam, literal
 from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects import mysql, sqlite
 from config import get_db_session  # Updated to use correct database session
+from render_cache import bump_data_version
 import time
 from functools import wraps
-import requests
-import uuid
+import openliga
+from logo_sprites import build_team_logo_sprites
+from season_calendar import get_season_calendar
+from reference_data import get_reference_data
+from metrics import record_successful_sync
+from tracing import span, traced
 import os
-from PIL import Image
 from datetime import datetime, timedelta
-from models import User, Match, Team, Prediction, UserVote
+from models import User, Match, Team, Prediction, UserVote, UserStats, RoundResult, FrozenRound
 from collections import defaultdict
 from sqlalchemy.exc import SQLAlchemyError
 import json
@@ -29,6 +34,9 @@ leagueShortcut_list = ["bl1", "dfb"] # bl1 for bundesliga 1
 leagueSeason = "2025"     # 2023 for 2023/2024 season
 teamFilterString = "Heidenheim"
 
+# Base URL of the OpenLigaDB API, e. g. http://localhost:8765 for the stub server in benchmarks/openliga_stub.py
+OPENLIGA_BASE_URL = os.getenv("OPENLIGA_BASE_URL", "https://api.openligadb.de").rstrip("/")
+
 
 # Tournament info
 # games_group_stage = 3 # Euro2024
@@ -42,17 +50,6 @@ teamFilterString = "Heidenheim"
 dummy_team_id = 5251
 
 
-def timer(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        print(f"Elapsed time for {func.__name__}: {elapsed_time:.4f} seconds")
-        return result
-    return wrapper
-
-
 def get_matches_db(db_session):
         return db_session.query(Match).all()
 
@@ -77,6 +74,32 @@ def login_required(f):
     return decorated_function
 
 
+# User ids (comma-separated) that may open the admin pages. Ids and not usernames, since
+# users choose and change their usernames themselves
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+
+def is_admin():
+    """Whether the logged in user is listed in ADMIN_USER_IDS"""
+    return session.get("user_id") in ADMIN_USER_IDS
+
+
+def admin_required(f):
+    """
+    Decorate routes to require a logged in user listed in ADMIN_USER_IDS.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get("user_id") is None:
+            return redirect("/login")
+        if not is_admin():
+            abort(403)
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 def make_image_filepath(team, img_folder):
     img_file_name = team['teamName'] + os.path.splitext(team['teamIconUrl'])[1]
     img_file_path = os.path.join(img_folder, img_file_name)
@@ -88,18 +111,12 @@ def make_image_filepath(team, img_folder):
 
 
 def get_openliga_json(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
+    return openliga.get_json(url)
 
-        return response.json()
-    
-    except (KeyError, IndexError, requests.RequestException, ValueError):
-        return None
-    
 
-def get_league_table(db_session):        
-    return db_session.query(Team).order_by(Team.teamRank.asc()).all()
+def get_league_table(db_session, data_version=None):
+    # Read from the reference data snapshot instead of the teams table
+    return list(get_reference_data(db_session, data_version).league_table)
 
 
 def insert_teams_to_db(db_session, leagueShortcut):
@@ -160,51 +177,32 @@ def insert_teams_to_db(db_session, leagueShortcut):
         # Commit the changes to the database
         db_session.commit()
 
+        # Pack the logos of all teams into the sprite sheets
+        if teams:
+            build_team_logo_sprites(db_session.query(Team.id, Team.teamIconPath).all())
+
+        bump_data_version(db_session)
+        db_session.commit()
+
     except Exception as e:
         print(f"Updating or inserting teams failed: {e}")
         db_session.rollback()  # Rollback in case of error
 
 
 def download_and_resize_logos(teams, img_folder):
-    # TODO only download if there is no team icon image already
-    os.makedirs(img_folder, exist_ok=True)
+    """Download the logos of the teams that are missing or changed, see logo_sync.py"""
+    logos = []
 
-    if not os.listdir(img_folder):
-        for index, team in enumerate(teams):
-            try:
-                img_url = team.get('teamIconUrl')
-                
-                if not img_url or len(img_url) > 255:
-                    #logging.error(f"No image URL found for team at index {index}: {team}")
-                    continue
-                    
-                #logging.info(f"Downloading image for team {team['teamName']} from {img_url}")
-                print(f"Downloading image for team {team['teamName']} from {img_url}")
-
-                response = requests.get(
-                    img_url,
-                    cookies={"session": str(uuid.uuid4())},
-                    headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.102 Safari/537.36",
-                             "Referer": "https://www.google.com/",
-                             "Accept-Language": "en-US,en;q=0.9",
-                             "Cache-Control": "no-cache",
-                             "Upgrade-Insecure-Requests": "1",},
-                )       ### Header from chatGPT to mimic a real computer
-                response.raise_for_status()
-
-                img_file_path = make_image_filepath(team, img_folder)
-
-                with open(img_file_path, 'wb') as f:
-                    f.write(response.content)
-
-                #logging.info(f"Image saved for team {team['teamName']} at {img_file_path}")
-
-                resize_image(img_file_path)
-                #logging.info(f"Image resized for team {team['teamName']}")
-            except (KeyError, IndexError, requests.RequestException, ValueError) as e:
-                #logging.error(f"Failed to download or process image for team {team['teamName']} at index {index}. Error: {e}")
-                print(f"Failed to download or process image for team {team['teamName']} at index {index}. Error: {e}")                
-                continue
+    for team in teams:
+        img_url = team.get('teamIconUrl')
+
+        if not img_url or len(img_url) > 255:
+            continue
+
+        logos.append((img_url, make_image_filepath(team, img_folder)))
+
+    from logo_sync import sync_logos   # Loads PIL and requests, only needed for the team sync
+    return sync_logos(logos)
 
 
 def update_league_table(db_session):
@@ -227,35 +225,107 @@ def update_league_table(db_session):
         db_session.query(Team).update({Team.lastUpdateTime: get_current_datetime_str()})
 
         # Commit the session to persist data
+        bump_data_version(db_session)
         db_session.commit()
 
 
-def insert_or_update_matches_to_db(db_session, leagueShortcut):
-    # Query openliga API with link from above
-    matchdata = get_openliga_json(get_matchdata_team_url(leagueShortcut))
-
-    if matchdata:
-        for match in matchdata:           
-            team1_score, team2_score = get_scores(match)
-
-            match_entry = Match(
-                id=match["matchID"],
-                matchday=match["group"]["groupOrderID"],
-                team1_id=match["team1"]["teamId"],
-                team2_id=match["team2"]["teamId"],
-                team1_score=team1_score,
-                team2_score=team2_score,
-                matchDateTime=match["matchDateTime"],
-                matchIsFinished=match["matchIsFinished"],
-                #location=match["location"]["locationCity"],        # does not work for smaller matches
-                lastUpdateDateTime=match["lastUpdateDateTime"],
-                leagueShortcut=leagueShortcut,
-                groupName=match["group"]["groupName"]
-            )
-            
-            db_session.merge(match_entry)  # Use merge to insert or update
+# Match columns that are synced from the OpenLigaDB matchdata
+synced_match_columns = ["matchday", "team1_id", "team2_id", "team1_score", "team2_score", "matchDateTime",
+                        "matchIsFinished", "lastUpdateDateTime", "leagueShortcut", "groupName"]
 
-    db_session.commit()
+
+def insert_or_update_matches_to_db(db_session, leagueShortcut, matchdata=None):
+    """Sync the matches of a league with the OpenLigaDB matchdata.
+
+    Only new or changed matches are written, all of them with one multi-row upsert.
+    Returns a dict with the number of inserted, updated and skipped matches.
+    """
+    sync_counts = {"inserted": 0, "updated": 0, "skipped": 0}
+
+    # Query openliga API with link from above, unless the matchdata was already fetched
+    if matchdata is None:
+        matchdata = get_openliga_json(get_matchdata_team_url(leagueShortcut))
+
+    if not matchdata:
+        return sync_counts
+
+    incoming_rows = {}
+    for match in matchdata:
+        row = make_match_row(match, leagueShortcut)
+        incoming_rows[row["id"]] = row
+
+    # Load the stored state of these matches in one query to compare against
+    stored_matches = {
+        stored_match.id: stored_match for stored_match in db_session.query(
+            Match.id, *[getattr(Match, column) for column in synced_match_columns]
+        ).filter(Match.id.in_(incoming_rows.keys()))
+    }
+
+    changed_rows = []
+    for match_id, row in incoming_rows.items():
+        stored_match = stored_matches.get(match_id)
+
+        if stored_match is None:
+            sync_counts["inserted"] += 1
+        elif any(getattr(stored_match, column) != row[column] for column in synced_match_columns):
+            sync_counts["updated"] += 1
+        else:
+            sync_counts["skipped"] += 1
+            continue
+
+        changed_rows.append(row)
+
+    if changed_rows:
+        with span("upsert_matches", league=leagueShortcut, rows=len(changed_rows)):
+            db_session.execute(get_upsert_statement(db_session, Match.__table__, changed_rows, synced_match_columns, ["id"]))
+        bump_data_version(db_session)
+        with span("commit"):
+            db_session.commit()
+
+    print(f"Matches {leagueShortcut}: {sync_counts['inserted']} inserted, {sync_counts['updated']} updated, {sync_counts['skipped']} skipped")
+
+    return sync_counts
+
+
+def make_match_row(match_API, leagueShortcut):
+    team1_score, team2_score = get_scores(match_API)
+    last_update = match_API["lastUpdateDateTime"]
+
+    return {
+        "id": match_API["matchID"],
+        "matchday": match_API["group"]["groupOrderID"],
+        "team1_id": match_API["team1"]["teamId"],
+        "team2_id": match_API["team2"]["teamId"],
+        "team1_score": team1_score,
+        "team2_score": team2_score,
+        "matchDateTime": normalize_datetime(match_API["matchDateTime"]),
+        "matchIsFinished": int(match_API["matchIsFinished"]),
+        #"location": match_API["location"]["locationCity"],        # does not work for smaller matches
+        "lastUpdateDateTime": normalize_datetime(last_update) if last_update else None,    # the db stores whole seconds
+        "leagueShortcut": leagueShortcut,
+        "groupName": match_API["group"]["groupName"]
+    }
+
+
+def get_upsert_statement(db_session, table, rows, update_columns, conflict_columns):
+    """Multi-row INSERT that updates the given columns of rows that already exist.
+
+    Uses ON DUPLICATE KEY UPDATE on MySQL and ON CONFLICT (conflict_columns) DO UPDATE otherwise (SQLite).
+    """
+    if db_session.get_bind().dialect.name == "mysql":
+        statement = mysql.insert(table).values(rows)
+        return statement.on_duplicate_key_update({column: statement.inserted[column] for column in update_columns})
+
+    statement = sqlite.insert(table).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_={column: statement.excluded[column] for column in update_columns}
+    )
+
+
+def get_insert_ignore_statement(table):
+    """INSERT that skips rows whose key already exists (INSERT IGNORE on MySQL, INSERT OR IGNORE on SQLite)."""
+    return table.insert().prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
 
 
 def get_scores(match_API):
@@ -274,25 +344,65 @@ def get_scores(match_API):
     return team1_score, team2_score
 
 
-def update_user_scores(db_session):
+# Full recompute of the user scores to verify the incrementally applied deltas
+USER_SCORES_RECONCILE_INTERVAL_SECONDS = 3600
+last_user_scores_reconciliation = 0.0
+
+
+@traced()
+def update_user_scores(db_session, reconcile=False):
+    global last_user_scores_reconciliation
     start_time = time.time()
     
     # Award points for the predictions in the prediction table
-    award_predictions(db_session)
+    with span("award_predictions") as award_span:
+        score_deltas = award_predictions(db_session)
+        award_span.set_attribute("users", len(score_deltas))
 
-    # Award users based on the points for each prediction
-    award_users(db_session)
-    
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    print(f"Elapsed time for update_user_scores: {elapsed_time:.4f} seconds")
+    # Apply only the changes of the (re)scored matches to the users
+    with span("award_users"):
+        award_users_incremental(db_session, score_deltas)
+
+    # Invalidate the cached leaderboard pages of all workers if scores changed
+    if score_deltas:
+        bump_data_version(db_session)
+
+    # Commit prediction points and user scores together
+    with span("commit"):
+        db_session.commit()
+
+    # Periodically recompute all user scores from scratch to verify the deltas
+    drifted_users = []
+    if reconcile or start_time - last_user_scores_reconciliation >= USER_SCORES_RECONCILE_INTERVAL_SECONDS:
+        with span("reconcile_user_scores"):
+            drifted_users = reconcile_user_scores(db_session)
+        last_user_scores_reconciliation = start_time
+
+    # Update the materialized statistics for the home and statistics page, only for users whose scores changed
+    with span("refresh_user_stats") as stats_span:
+        changed_users = set(score_deltas) | set(drifted_users)
+        stats_span.set_attribute("users", len(changed_users))
+        refresh_user_stats(db_session, changed_users)
+
+    # Store the results of game rounds that are over
+    with span("freeze_finished_game_rounds"):
+        freeze_finished_game_rounds(db_session)
 
 
 def award_predictions(db_session):
+    """Award points for the predictions of all matches that need to be evaluated.
+
+    All pending matches are scored with one set-based UPDATE joined against the matches,
+    so the number of round-trips does not depend on how many matches finished together.
+    Does not commit. Returns the per-user score changes against the previous scoring
+    of these matches as {user_id: (points, correct_result, correct_goal_diff, correct_tendency)}.
+    The caller must commit the deltas applied to the users in the same transaction.
+    """
     # Get matches that need to be evaluated
     current_time = datetime.now()
-    matches_to_evaluate = db_session.query(Match).filter(
+    match_ids = [match_id for match_id, in db_session.query(Match.id).filter(
         Match.predictions_evaluated == 0,
+        Match.team1_score.isnot(None),
         or_(
             Match.matchIsFinished == 1,
             and_(
@@ -300,65 +410,191 @@ def award_predictions(db_session):
                 Match.matchIsFinished == 0
             )
         )
-    ).all()
+    )]
 
-    predictions_awarded = False
-
-    for match in matches_to_evaluate:
-        if match.team1_score is not None:
-            # Calculate match outcome parameters
-            team1_score = match.team1_score
-            team2_score = match.team2_score
-            goal_diff = team1_score - team2_score
-            winner = 1 if team1_score > team2_score else 2 if team1_score < team2_score else 0
-
-            # Update predictions in bulk
-            db_session.query(Prediction).filter(Prediction.match_id == match.id).update({
-                Prediction.points: case(
-                    ((Prediction.team1_score == team1_score) & (Prediction.team2_score == team2_score), 4),
-                    ((Prediction.goal_diff == goal_diff) & (winner != 0), 3),
-                    (((Prediction.winner == winner) | ((Prediction.goal_diff == goal_diff) & (winner == 0))), 2),
-                    else_=0
-                )
-            }, synchronize_session=False)
+    if not match_ids:
+        return {}
 
-            # Update match evaluation status
-            if match.matchIsFinished == 1:
-                match.predictions_evaluated = 1
-            match.evaluation_Date = get_current_datetime_as_object()
+    # Remember the scoring before the update to compute the deltas afterwards, this locks the
+    # predictions of the matches until the commit in update_user_scores
+    scores_before = get_user_scores_for_matches(db_session, match_ids)
 
-            predictions_awarded = True
+    # Match outcome parameters as SQL expressions
+    goal_diff = Match.team1_score - Match.team2_score
+    winner = case(
+        (Match.team1_score > Match.team2_score, 1),
+        (Match.team1_score < Match.team2_score, 2),
+        else_=0
+    )
 
-    if predictions_awarded:
-        # Commit changes for match predictions
-        db_session.commit()
-        
+    # Update the predictions of all pending matches in one statement
+    db_session.query(Prediction).filter(
+        Prediction.match_id == Match.id,
+        Match.id.in_(match_ids)
+    ).update({
+        Prediction.points: case(
+            ((Prediction.team1_score == Match.team1_score) & (Prediction.team2_score == Match.team2_score), 4),
+            ((Prediction.goal_diff == goal_diff) & (winner != 0), 3),
+            (((Prediction.winner == winner) | ((Prediction.goal_diff == goal_diff) & (winner == 0))), 2),
+            else_=0
+        )
+    }, synchronize_session=False)
 
-def award_users(db_session):
-    # Update total points in the users table in bulk # chatGPT
-    user_predictions = db_session.query(
+    # Update match evaluation status in bulk, finished matches are not evaluated again
+    db_session.query(Match).filter(Match.id.in_(match_ids)).update({
+        Match.predictions_evaluated: case((Match.matchIsFinished == 1, 1), else_=Match.predictions_evaluated),
+        Match.evaluation_Date: get_current_datetime_as_object()
+    }, synchronize_session=False)
+
+    scores_after = get_user_scores_for_matches(db_session, match_ids)
+
+    return get_score_deltas(scores_before, scores_after)
+
+
+# Position of the category counters in the score tuples, by points of a prediction
+score_category_index = {4: 1, 3: 2, 2: 3}
+
+
+def get_user_scores_for_matches(db_session, match_ids):
+    """Points and category counts per user, restricted to the predictions of the given matches.
+
+    The prediction rows are read with FOR UPDATE and stay locked until the commit. Another
+    worker scoring the same matches waits for them and then reads the points written here,
+    so the same points are never added to the users twice.
+    """
+    user_scores = defaultdict(lambda: [0, 0, 0, 0])
+
+    predictions = db_session.query(Prediction.user_id, Prediction.points).filter(
+        Prediction.match_id.in_(match_ids)
+    ).order_by(Prediction.id).with_for_update()
+
+    for user_id, points in predictions:
+        scores = user_scores[user_id]
+        scores[0] += points or 0
+        if points in score_category_index:
+            scores[score_category_index[points]] += 1
+
+    return {user_id: tuple(scores) for user_id, scores in user_scores.items()}
+
+
+def get_score_deltas(scores_before, scores_after):
+    score_deltas = {}
+    no_scores = (0, 0, 0, 0)
+
+    for user_id in scores_before.keys() | scores_after.keys():
+        before = scores_before.get(user_id, no_scores)
+        after = scores_after.get(user_id, no_scores)
+        delta = tuple(new - old for new, old in zip(after, before))
+
+        if any(delta):
+            score_deltas[user_id] = delta
+
+    return score_deltas
+
+
+def award_users_incremental(db_session, score_deltas):
+    """Add the score deltas to the users in one batched UPDATE. Does not commit."""
+    if not score_deltas:
+        return
+
+    users = User.__table__
+    statement = users.update().where(
+        users.c.id == bindparam("b_user_id")
+    ).values(
+        total_points=func.coalesce(users.c.total_points, 0) + bindparam("b_points"),
+        correct_result=func.coalesce(users.c.correct_result, 0) + bindparam("b_correct_result"),
+        correct_goal_diff=func.coalesce(users.c.correct_goal_diff, 0) + bindparam("b_correct_goal_diff"),
+        correct_tendency=func.coalesce(users.c.correct_tendency, 0) + bindparam("b_correct_tendency")
+    )
+
+    db_session.execute(statement, [
+        {
+            "b_user_id": user_id,
+            "b_points": delta[0],
+            "b_correct_result": delta[1],
+            "b_correct_goal_diff": delta[2],
+            "b_correct_tendency": delta[3]
+        }
+        for user_id, delta in score_deltas.items()
+    ])
+
+
+def reconcile_user_scores(db_session):
+    """Recompute all user scores from the predictions and report users whose scores had drifted.
+
+    Returns the ids of these users.
+    """
+    totals = get_user_prediction_totals(db_session)
+
+    # Outer join, users without any predictions left must have zero scores
+    drifted_users = [user_id for user_id, in db_session.query(User.id).outerjoin(
+        totals, totals.c.user_id == User.id
+    ).filter(
+        or_(
+            func.coalesce(User.total_points, 0) != func.coalesce(totals.c.total_points, 0),
+            func.coalesce(User.correct_result, 0) != func.coalesce(totals.c.correct_result, 0),
+            func.coalesce(User.correct_goal_diff, 0) != func.coalesce(totals.c.correct_goal_diff, 0),
+            func.coalesce(User.correct_tendency, 0) != func.coalesce(totals.c.correct_tendency, 0)
+        )
+    )]
+
+    if drifted_users:
+        print(f"Reconciling user scores: {len(drifted_users)} user(s) differed from the predictions: {drifted_users}")
+        bump_data_version(db_session)
+
+    award_users(db_session)
+
+    return drifted_users
+
+
+def get_user_prediction_totals(db_session):
+    # Subquery with the points and category counts of all predictions per user
+    return db_session.query(
         Prediction.user_id,
         func.sum(Prediction.points).label('total_points'),
         func.count(case((Prediction.points == 4, 1))).label('correct_result'),
         func.count(case((Prediction.points == 3, 1))).label('correct_goal_diff'),
         func.count(case((Prediction.points == 2, 1))).label('correct_tendency')
-    ).group_by(Prediction.user_id).all()
+    ).group_by(Prediction.user_id).subquery()
 
-    for user_prediction in user_predictions:
-        db_session.query(User).filter(User.id == user_prediction.user_id).update({
-            User.total_points: user_prediction.total_points,
-            User.correct_result: user_prediction.correct_result,
-            User.correct_goal_diff: user_prediction.correct_goal_diff,
-            User.correct_tendency: user_prediction.correct_tendency
-        }, synchronize_session=False)
+
+def award_users(db_session):
+    # Update the totals of all users in one UPDATE joined against the aggregated predictions
+    totals = get_user_prediction_totals(db_session)
+
+    db_session.query(User).filter(User.id == totals.c.user_id).update({
+        User.total_points: func.coalesce(totals.c.total_points, 0),
+        User.correct_result: func.coalesce(totals.c.correct_result, 0),
+        User.correct_goal_diff: func.coalesce(totals.c.correct_goal_diff, 0),
+        User.correct_tendency: func.coalesce(totals.c.correct_tendency, 0)
+    }, synchronize_session=False)
+
+    # The joined UPDATE is an inner join on MySQL and SQLite, so the users without any
+    # predictions left, i. e. the rest of the outer join, are reset to zero separately
+    db_session.query(User).filter(
+        ~User.id.in_(db_session.query(Prediction.user_id)),
+        or_(
+            func.coalesce(User.total_points, 0) != 0,
+            func.coalesce(User.correct_result, 0) != 0,
+            func.coalesce(User.correct_goal_diff, 0) != 0,
+            func.coalesce(User.correct_tendency, 0) != 0
+        )
+    ).update({
+        User.total_points: 0,
+        User.correct_result: 0,
+        User.correct_goal_diff: 0,
+        User.correct_tendency: 0
+    }, synchronize_session=False)
 
     # Commit all changes to the database
     db_session.commit()
 
 
-def get_valid_matches(matches):
+def get_valid_matches(matches, now=None):
+    # Matches that can still be predicted, all checked against the same point in time
+    now = now or get_current_datetime_as_object()
     return [match for match in matches
-            if match.matchIsFinished == 0 and get_current_datetime_as_object() < match.matchDateTime]
+            if match.matchIsFinished == 0 and now < match.matchDateTime]
 
 def update_user_predictions(predictions, user_id):
     db = get_db_session()  # Use the correct session provider
@@ -387,10 +623,31 @@ def validate_prediction(prediction):
 
 
 def process_predictions(valid_matches, session, db_session, request):
+    """Save the submitted predictions of the user for the valid matches.
+
+    The user's existing predictions are loaded with one query, new and changed ones are
+    written with one upsert on (user_id, match_id) and cleared ones with one DELETE,
+    so submitting the same form twice doesn't create duplicates.
+    """
     prediction_added = False
     error_message = "Keine Änderungen oder Tipps fehlerhaft"
     success_message = "Tipp(s) erfolgreich gespeichert"
-    
+    user_id = session["user_id"]
+    now = get_current_datetime_as_object()
+
+    # Retrieve the existing predictions for all valid matches at once
+    existing_predictions = {
+        prediction.match_id: prediction for prediction in db_session.query(
+            Prediction.match_id, Prediction.team1_score, Prediction.team2_score
+        ).filter(
+            Prediction.user_id == user_id,
+            Prediction.match_id.in_([match.id for match in valid_matches])
+        )
+    }
+
+    rows_to_upsert = []
+    match_ids_to_delete = []
+
     # Iterate through valid matches and process predictions
     for match in valid_matches:
         match_id = match.id
@@ -399,13 +656,11 @@ def process_predictions(valid_matches, session, db_session, request):
         team1_score = request.form.get(f'team1Score_{match_id}')
         team2_score = request.form.get(f'team2Score_{match_id}')
 
-        # Retrieve or create prediction entry
-        prediction = db_session.query(Prediction).filter_by(user_id=session["user_id"], match_id=match_id).first()
+        prediction = existing_predictions.get(match_id)
 
         # If prediction existed, but input fields were posted empty, then delete the prediction
         if prediction and not team1_score and not team2_score:
-            db_session.delete(prediction)
-            prediction_added = True
+            match_ids_to_delete.append(match_id)
             continue
 
         # Validate and convert scores to integers
@@ -422,48 +677,59 @@ def process_predictions(valid_matches, session, db_session, request):
             error_message = "Kein Unentschieden bei KO-Spielen möglich"
             continue
 
-        if prediction:
-            # Update existing prediction if changed
-            if team1_score != prediction.team1_score or team2_score != prediction.team2_score:
-                prediction.team1_score = team1_score
-                prediction.team2_score = team2_score
-                prediction.goal_diff = team1_score - team2_score
-                prediction.winner = winner
-                prediction.prediction_date = get_current_datetime_as_object()
-                prediction_added = True
-                print("Prediction changed")
-        else:
-            # Create new prediction if none exists
-            new_prediction = Prediction(
-                user_id=session["user_id"],
-                matchday=match.matchday,
-                match_id=match_id,
-                team1_score=team1_score,
-                team2_score=team2_score,
-                goal_diff=team1_score - team2_score,
-                winner=winner,
-                prediction_date=get_current_datetime_as_object()
-            )
-            db_session.add(new_prediction)
-            prediction_added = True
+        # Skip unchanged predictions
+        if prediction and team1_score == prediction.team1_score and team2_score == prediction.team2_score:
+            continue
+
+        rows_to_upsert.append({
+            "user_id": user_id,
+            "matchday": match.matchday,
+            "match_id": match_id,
+            "team1_score": team1_score,
+            "team2_score": team2_score,
+            "goal_diff": team1_score - team2_score,
+            "winner": winner,
+            "prediction_date": now
+        })
+
+    if match_ids_to_delete:
+        db_session.query(Prediction).filter(
+            Prediction.user_id == user_id,
+            Prediction.match_id.in_(match_ids_to_delete)
+        ).delete(synchronize_session=False)
+        prediction_added = True
+
+    if rows_to_upsert:
+        db_session.execute(get_upsert_statement(
+            db_session, Prediction.__table__, rows_to_upsert,
+            ["team1_score", "team2_score", "goal_diff", "winner", "prediction_date"], ["user_id", "match_id"]
+        ))
+        prediction_added = True
 
     # Commit changes if predictions were added
     if prediction_added:
         db_session.commit()
+        refresh_user_prediction_count(db_session, user_id)
         flash(success_message, "success")
     else:
         flash(error_message, "error")
 
 
 def delete_user_and_predictions(user_id, db_session):
-    # Delete predictions from the user
+    # Delete predictions, statistics and round results from the user
     db_session.query(Prediction).filter_by(user_id=user_id).delete()
+    db_session.query(UserStats).filter_by(user_id=user_id).delete()
+    db_session.query(RoundResult).filter_by(user_id=user_id).delete()
 
     # Delete the user
     db_session.query(User).filter_by(id=user_id).delete()
 
+    bump_data_version(db_session)
     db_session.commit()
 
+    # The other users' rank, number of users and leader changed
+    refresh_user_stats(db_session, set())
+
 
 def update_match_score_for_live_scores(db_session, match_API):
     """Update one live match in-memory and return whether anything changed."""
@@ -472,7 +738,7 @@ def update_match_score_for_live_scores(db_session, match_API):
     print("live match to update: ", match["matchID"])
 
     team1_score, team2_score = get_scores(match)
-    last_update = match["lastUpdateDateTime"]
+    last_update = normalize_datetime(match["lastUpdateDateTime"]) if match["lastUpdateDateTime"] else None
 
     print("Live scores: ", team1_score, ":", team2_score)
 
@@ -483,7 +749,7 @@ def update_match_score_for_live_scores(db_session, match_API):
     changed = (
         existing_match.team1_score != team1_score
         or existing_match.team2_score != team2_score
-        or str(existing_match.lastUpdateDateTime) != str(last_update)
+        or existing_match.lastUpdateDateTime != last_update
     )
 
     if changed:
@@ -494,89 +760,195 @@ def update_match_score_for_live_scores(db_session, match_API):
     return changed
 
 
+# Keys of the insights dict that are read from the materialized user statistics
+insight_columns = ["rank", "no_users", "leader", "total_points", "predictions_rated", "total_games_predicted",
+                   "missed_games", "corr_result", "corr_goal_diff", "corr_tendency", "wrong_predictions",
+                   "corr_result_p", "corr_goal_diff_p", "corr_tendency_p", "wrong_predictions_p", "points_per_tip"]
+
+
 def get_insights(db_session):
     user_id = session.get("user_id")
 
-    # Predictions rated
-    predictions_rated = db_session.query(func.count(Prediction.id).label('predictions_rated'))\
-        .join(Match, Match.id == Prediction.match_id)\
-        .filter(Prediction.user_id == user_id, Match.matchIsFinished == 1)\
-        .scalar()
+    # Statistics of the user, maintained by refresh_user_stats
+    user_stats = get_user_stats(db_session, user_id)
+
+    if user_stats is None:
+        # The row is created at registration, only users from before that need it here
+        refresh_user_stats(db_session, {user_id})
+        user_stats = get_user_stats(db_session, user_id)
 
-    # Prediction count
-    prediction_count = db_session.query(func.count(Prediction.id).label('prediction_count'))\
-        .filter(Prediction.user_id == user_id)\
-        .scalar()
+    stats, username = user_stats
+
+    # Store the statistics in the insights dictionary
+    insights = {column: getattr(stats, column) for column in insight_columns}
+    insights["username"] = username
 
+    return insights
+
+
+def get_user_stats(db_session, user_id):
+    return db_session.query(UserStats, User.username).join(
+        User, User.id == UserStats.user_id
+    ).filter(
+        UserStats.user_id == user_id
+    ).first()
+
+
+def refresh_user_stats(db_session, user_ids=None):
+    """Update the statistics in the user_stats table.
+
+    Without user_ids the statistics of all users are recomputed. With user_ids only the
+    predictions of these users (and of users without a row yet) are aggregated, all other
+    users only get their rank, the number of users and the leader updated where these
+    changed. Nothing is done for an empty user_ids unless users were added or deleted.
+    When matches finished since the last refresh all users are recomputed, as that
+    changes the rated and missed games of everyone.
+    """
     # Finished matches
-    finished_matches = db_session.query(func.count(Match.id).label('completed_matches'))\
-        .filter(Match.matchIsFinished == 1)\
-        .scalar()
+    finished_matches = db_session.query(func.count(Match.id)).filter(Match.matchIsFinished == 1).scalar()
+    no_users = db_session.query(func.count(User.id)).scalar()
 
-    # Total points of the user
-    total_points_user = db_session.query(User.total_points).filter(User.id == user_id).scalar()
+    if user_ids is not None:
+        stored_counts = db_session.query(
+            UserStats.no_users, UserStats.predictions_rated + UserStats.missed_games
+        ).first()
 
-    # Leader
-    leader = db_session.query(User.username).order_by(desc(User.total_points)).first()[0]
+        if stored_counts is None or stored_counts[1] != finished_matches:
+            user_ids = None
+        elif not user_ids and stored_counts[0] == no_users:
+            return
 
-    # User rank
-    subquery = db_session.query(
-        User.id,
-        func.row_number().over(
-            order_by=[
-                desc(User.total_points),
-                desc(User.correct_result),
-                desc(User.correct_goal_diff),
-                desc(User.correct_tendency)
-            ]
-        ).label('rank')
-    ).subquery()
-    rank = db_session.query(subquery.c.rank).filter(subquery.c.id == user_id).scalar()
-
-    # Base statistics for the user
-    base_stats = db_session.query(User.correct_result, User.correct_goal_diff, User.correct_tendency)\
-        .filter(User.id == user_id).first()
-
-    # Number of users
-    no_users = db_session.query(func.count(User.id).label('no_users')).scalar()
+    # Users in order of their rank
+    users = db_session.query(
+        User.id, User.username, User.total_points, User.correct_result, User.correct_goal_diff, User.correct_tendency
+    ).order_by(
+        desc(User.total_points),
+        desc(User.correct_result),
+        desc(User.correct_goal_diff),
+        desc(User.correct_tendency)
+    ).all()
 
-    # Store the statistics in the insights dictionary
-    insights = {}
+    if not users:
+        return
+
+    stored_ranks = {
+        user_id: (rank, stored_no_users, leader) for user_id, rank, stored_no_users, leader in db_session.query(
+            UserStats.user_id, UserStats.rank, UserStats.no_users, UserStats.leader
+        )
+    }
 
-    # If there have been predictions, count how many were made
-    if predictions_rated:
-        insights["predictions_rated"] = predictions_rated
+    if user_ids is None:
+        refresh_ids = {user.id for user in users}
     else:
-        insights["predictions_rated"] = 0
-
-    # Create useful statistics and store in insights dict    
-    insights["total_games_predicted"] = prediction_count
-    insights["missed_games"] = finished_matches - predictions_rated    
-    insights["total_points"] = total_points_user
-    insights["username"] = db_session.query(User.username).filter(User.id == user_id).scalar()
-    insights["no_users"] = no_users
-    insights["rank"] = rank
-    insights["corr_result"] = base_stats.correct_result
-    insights["corr_goal_diff"] = base_stats.correct_goal_diff
-    insights["corr_tendency"] = base_stats.correct_tendency
-    insights["wrong_predictions"] = insights["predictions_rated"] - insights["corr_result"] - insights["corr_goal_diff"] - insights["corr_tendency"]
-    insights["leader"] = leader
+        refresh_ids = set(user_ids) | {user.id for user in users if user.id not in stored_ranks}
+
+    # Predictions made and predictions rated per user
+    prediction_counts_query = db_session.query(
+        Prediction.user_id,
+        func.count(Prediction.id),
+        func.count(case((Match.matchIsFinished == 1, 1)))
+    ).join(
+        Match, Match.id == Prediction.match_id
+    )
+
+    if user_ids is not None:
+        prediction_counts_query = prediction_counts_query.filter(Prediction.user_id.in_(refresh_ids))
+
+    prediction_counts = {
+        user_id: (prediction_count, predictions_rated)
+        for user_id, prediction_count, predictions_rated in prediction_counts_query.group_by(Prediction.user_id)
+    }
+
+    leader = users[0].username
+    updated_at = get_current_datetime_as_object()
+    rows = []
+    rank_rows = []
+
+    for rank, user in enumerate(users, start=1):
+        if user.id not in refresh_ids:
+            # Only the position in the ranking can change for the other users
+            if stored_ranks[user.id] != (rank, len(users), leader):
+                rank_rows.append({"b_user_id": user.id, "b_rank": rank, "b_no_users": len(users), "b_leader": leader})
+            continue
+
+        prediction_count, predictions_rated = prediction_counts.get(user.id, (0, 0))
+        rows.append(make_user_stats_row(user, rank, len(users), leader, finished_matches,
+                                        prediction_count, predictions_rated, updated_at))
+
+    if rows:
+        update_columns = [column for column in rows[0] if column != "user_id"]
+        db_session.execute(get_upsert_statement(db_session, UserStats.__table__, rows, update_columns, ["user_id"]))
+
+    if rank_rows:
+        user_stats = UserStats.__table__
+        db_session.execute(user_stats.update().where(
+            user_stats.c.user_id == bindparam("b_user_id")
+        ).values(
+            rank=bindparam("b_rank"),
+            no_users=bindparam("b_no_users"),
+            leader=bindparam("b_leader")
+        ), rank_rows)
+
+    db_session.commit()
+
+
+def make_user_stats_row(user, rank, no_users, leader, finished_matches, prediction_count, predictions_rated, updated_at):
+    total_points = user.total_points or 0
+    corr_result = user.correct_result or 0
+    corr_goal_diff = user.correct_goal_diff or 0
+    corr_tendency = user.correct_tendency or 0
+    wrong_predictions = predictions_rated - corr_result - corr_goal_diff - corr_tendency
+
+    row = {
+        "user_id": user.id,
+        "rank": rank,
+        "no_users": no_users,
+        "leader": leader,
+        "total_points": total_points,
+        "predictions_rated": predictions_rated,
+        "total_games_predicted": prediction_count,
+        "missed_games": finished_matches - predictions_rated,
+        "corr_result": corr_result,
+        "corr_goal_diff": corr_goal_diff,
+        "corr_tendency": corr_tendency,
+        "wrong_predictions": wrong_predictions,
+        "updated_at": updated_at
+    }
 
     # Differentiate if predictions have been rated to avoid dividing by 0 for the percentage
-    if insights["predictions_rated"] != 0:
-        insights["corr_result_p"] = round((base_stats.correct_result / insights["predictions_rated"])*100)
-        insights["corr_goal_diff_p"] = round(base_stats.correct_goal_diff / insights["predictions_rated"]*100)
-        insights["corr_tendency_p"] = round(base_stats.correct_tendency / insights["predictions_rated"]*100)
-        insights["wrong_predictions_p"] = round(insights["wrong_predictions"] / insights["predictions_rated"]*100) 
-        insights["points_per_tip"] = round(total_points_user / insights["predictions_rated"], 2)
+    if predictions_rated != 0:
+        row["corr_result_p"] = round(corr_result / predictions_rated * 100)
+        row["corr_goal_diff_p"] = round(corr_goal_diff / predictions_rated * 100)
+        row["corr_tendency_p"] = round(corr_tendency / predictions_rated * 100)
+        row["wrong_predictions_p"] = round(wrong_predictions / predictions_rated * 100)
+        row["points_per_tip"] = round(total_points / predictions_rated, 2)
     else:
-        insights["corr_result_p"] = 0
-        insights["corr_goal_diff_p"] = 0
-        insights["corr_tendency_p"] = 0
-        insights["wrong_predictions_p"] = 0
-        insights["points_per_tip"] = 0
+        row["corr_result_p"] = 0
+        row["corr_goal_diff_p"] = 0
+        row["corr_tendency_p"] = 0
+        row["wrong_predictions_p"] = 0
+        row["points_per_tip"] = 0
+
+    return row
 
-    return insights
+
+def rename_user_stats_leader(db_session, old_username, new_username):
+    db_session.query(UserStats).filter(UserStats.leader == old_username).update({
+        UserStats.leader: new_username
+    }, synchronize_session=False)
+    db_session.commit()
+
+
+def refresh_user_prediction_count(db_session, user_id):
+    # Only the number of predictions changes when a user submits predictions for upcoming matches
+    prediction_count = db_session.query(func.count(Prediction.id)).filter(
+        Prediction.user_id == user_id
+    ).scalar_subquery()
+
+    db_session.query(UserStats).filter(UserStats.user_id == user_id).update({
+        UserStats.total_games_predicted: prediction_count
+    }, synchronize_session=False)
+    db_session.commit()
 
 
 def is_update_needed_league_table(db_session):
@@ -695,33 +1067,46 @@ def update_match_in_db(matchdata_API, match_db, db_session):
     db_session.commit()
 
 
-@timer
+@traced()
 def update_matches_and_scores(db_session):
     print("Updating matches and user scores...")
 
+    # Fetch the matchdata of all leagues concurrently
+    urls = {leagueShortcut: get_matchdata_team_url(leagueShortcut) for leagueShortcut in leagueShortcut_list}
+    with span("fetch_matchdata", leagues=len(urls)):
+        matchdata_by_url = openliga.get_json_many(urls.values())
+
     for leagueShortcut in leagueShortcut_list:
         #insert_teams_to_db(db_session, leagueShortcut)
-        insert_or_update_matches_to_db(db_session, leagueShortcut)
+        with span("sync_matches", league=leagueShortcut) as sync_span:
+            sync_counts = insert_or_update_matches_to_db(db_session, leagueShortcut, matchdata_by_url[urls[leagueShortcut]])
+            for key, count in sync_counts.items():
+                sync_span.set_attribute(key, count)
 
     update_user_scores(db_session)
+
+    # Only a sync that got the matchdata of every league counts as successful for /metrics
+    if all(matchdata is not None for matchdata in matchdata_by_url.values()):
+        record_successful_sync()
     
     print("Matches and user scores updated.")
 
 
-@timer
+@traced()
 def update_live_matches_and_scores(db_session):
     print("Updating live matches and user scores...")
 
-    live_matches = find_live_matches(db_session)
+    # Don't try to update manually added games (indicated by negative match id's)
+    live_matches = [match for match in find_live_matches(db_session) if match.id >= 0]
     any_live_match_changed = False
     any_live_match_finished = False
 
-    for match in live_matches:
-        # Don't try to update manually added games (indicated by negative match id's)
-        if match.id < 0:
-            continue
+    # Fetch all live matches concurrently
+    with span("fetch_live_matchdata", matches=len(live_matches)):
+        matchdata_by_id = get_matchdata_openliga_many([match.id for match in live_matches])
 
-        match_data = get_matchdata_openliga(match.id)
+    for match in live_matches:
+        match_data = matchdata_by_id.get(match.id)
         if not match_data:
             continue
 
@@ -732,7 +1117,8 @@ def update_live_matches_and_scores(db_session):
             any_live_match_finished = True
 
     if any_live_match_changed:
-        db_session.commit()
+        with span("commit"):
+            db_session.commit()
         update_user_scores(db_session)
 
     if any_live_match_finished:
@@ -744,16 +1130,23 @@ def update_live_matches_and_scores(db_session):
 
 
 def get_matchdata_openliga(id):
-    url = f"https://api.openligadb.de/getmatchdata/{id}"
+    url = get_matchdata_url(id)
 
     matchdata = get_openliga_json(url)
 
     return matchdata
 
 
+def get_matchdata_openliga_many(ids):
+    # Returns a dict mapping each match id to its matchdata (or None if the request failed)
+    matchdata_by_url = openliga.get_json_many(get_matchdata_url(id) for id in ids)
+
+    return {id: matchdata_by_url[get_matchdata_url(id)] for id in ids}
+
+
 def get_last_online_change(matchday):
     # Make url to get last online change
-    url = f"https://api.openligadb.de/getlastchangedate/{leagueShortcut}/{leagueSeason}/{matchday}"
+    url = f"{OPENLIGA_BASE_URL}/getlastchangedate/{leagueShortcut}/{leagueSeason}/{matchday}"
 
     # Query API and convert to correct format
     # (to ensure that the datetime module works correctly)
@@ -763,7 +1156,7 @@ def get_last_online_change(matchday):
 
 def get_current_matchday_openliga():
     # Openliga DB API
-    url = f"https://api.openligadb.de/getcurrentgroup/{leagueShortcut}"
+    url = f"{OPENLIGA_BASE_URL}/getcurrentgroup/{leagueShortcut}"
 
     # Query API
     current_matchday = get_openliga_json(url)
@@ -774,18 +1167,6 @@ def get_current_matchday_openliga():
     return None
 
 
-def resize_image(image_path, max_size=(100, 100)):
-    """ For faster load times of the page, it is useful to lower the resolution of the pictures """
-    if image_path.lower().endswith(('.jpg', '.jpeg', '.png')):
-        # Open the image
-        with Image.open(image_path) as f:
-            # Resize the image while maintaining the aspect ratio
-            f.thumbnail(max_size)
-
-            # Save the resized image to the output folder
-            f.save(image_path)
-
-
 def add_up_decimals_to_6(date_string):
     # Format dates of the API to make them usable with the datetime module. Intended to use with ISO formatted dates
     split_string = date_string.split('.')
@@ -895,6 +1276,16 @@ def find_live_matches(db_session):
     return live_matches
 
 
+def find_next_kickoff(db_session):
+    current_time = datetime.now()
+    # Kickoff time of the next match that has not started yet
+    next_kickoff = db_session.query(func.min(Match.matchDateTime)).filter(
+        Match.matchDateTime > current_time
+    ).scalar()
+
+    return next_kickoff
+
+
 def find_closest_in_time_matchday_db(db_session):
     return find_closest_in_time_match(db_session).matchday
 
@@ -938,38 +1329,6 @@ def find_next_matchday_db(db_session):
     return next_matchday_db.matchday
 
 
-def find_matchday_to_display_tippen(db_session):
-    match = find_next_match_db(db_session)
-
-    if match:
-        return match.matchday
-    
-    else:
-        # If no unfinished match is found, return the last finished match
-        last_matchday  = db_session.query(
-            Match.matchday
-        ).filter(
-            Match.matchIsFinished == 1
-        ).order_by(
-            Match.matchDateTime.desc()
-        ).first()
-
-        if last_matchday is None:
-            # Handle the case where there are no finished matches
-            raise ValueError("No matches found, neither unfinished nor finished.")
-
-        return last_matchday.matchday
-    
-
-def find_next_match_db(db_session):
-    query = db_session.query(
-        Match
-        ).filter(
-            Match.matchIsFinished == 0
-        ).first()
-    return query
-
-
 def get_most_recently_updated_match_by_matchday(db_session, matchday):
     most_recent_match = db_session.query(Match).filter_by(matchday=matchday).order_by(desc(Match.lastUpdateDateTime)).first()
     return most_recent_match
@@ -983,15 +1342,19 @@ def group_matches_by_date(matches):
     return matches_by_date
 
 
+def get_matchdata_url(id):
+    return f"{OPENLIGA_BASE_URL}/getmatchdata/{id}"
+
+
 def get_matchdata_team_url(leagueShortcut):
-    return f"https://api.openligadb.de/getmatchdata/{leagueShortcut}/{leagueSeason}/{teamFilterString}"
+    return f"{OPENLIGA_BASE_URL}/getmatchdata/{leagueShortcut}/{leagueSeason}/{teamFilterString}"
 
 
 def get_available_teams_url(leagueShortcut):
-    return f"https://api.openligadb.de/getavailableteams/{leagueShortcut}/{leagueSeason}"
+    return f"{OPENLIGA_BASE_URL}/getavailableteams/{leagueShortcut}/{leagueSeason}"
 
 
-def get_matches_by_gameround(db_session, index):
+def get_matches_by_gameround(db_session, index, data_version=None):
     round_list = get_game_rounds()
 
     if index < 0 or index >= len(round_list):           # Chatgpt
@@ -999,75 +1362,168 @@ def get_matches_by_gameround(db_session, index):
     
     start_date, end_date = round_list[index]
 
-    # Adjust the end_date to include the entire last day
-    end_date = end_date
+    # Matches between the start_date and end_date from the reference data snapshot, with their teams
+    return get_reference_data(db_session, data_version).get_matches_between(start_date, end_date)
 
-    print(f"from {start_date} to {end_date}")
-    
-    # Query to filter matches between the start_date and end_date
-    matches = db_session.query(Match).filter(
-        and_(
-            Match.matchDateTime >= start_date,
-            Match.matchDateTime < end_date
-        )
-    ).order_by(Match.matchDateTime).all()
 
-    return matches
+def get_user_predictions_by_match(db_session, user_id, match_ids):
+    """Return the user's predictions for the given matches as {match_id: prediction}"""
+    if not match_ids:
+        return {}
 
+    predictions = db_session.query(Prediction).filter(
+        Prediction.user_id == user_id,
+        Prediction.match_id.in_(match_ids)
+    ).all()
 
-def get_filtered_predictions_by_date(db_session, index):
-    # made by chatgpt based on get_filtered_matches_by_date
-    round_list = get_game_rounds()
+    return {prediction.match_id: prediction for prediction in predictions}
 
-    if index < 0 or index >= len(round_list):
-        raise IndexError("Invalid index for game rounds.")
-    
-    start_date, end_date = round_list[index]
 
-    # Adjust the end_date to include the entire last day
-    end_date = end_date
+def get_prediction_matrix(db_session, users, matches):
+    """Pack the predictions for the given matches into a dense user x match matrix.
+
+    Rows follow the order of `users`, columns the order of `matches`. A cell holds the
+    (user_id, match_id, team1_score, team2_score, points) row of the prediction or None.
+    Only the predictions of the given users and matches are loaded, not the whole season.
+    Returns the matrix and the summed points per row.
+    """
+    row_index = {user.id: row for row, user in enumerate(users)}
+    column_index = {match.id: column for column, match in enumerate(matches)}
+
+    matrix = [[None] * len(matches) for _ in users]
+    points_per_row = [0] * len(users)
 
-    predictions = db_session.query(Prediction).select_from(Prediction).join(
-        Match, Prediction.match_id == Match.id
+    if not row_index or not column_index:
+        return matrix, points_per_row
+
+    predictions = db_session.query(
+        Prediction.user_id,
+        Prediction.match_id,
+        Prediction.team1_score,
+        Prediction.team2_score,
+        Prediction.points
     ).filter(
-        and_(
-            Match.matchDateTime >= start_date,
-            Match.matchDateTime < end_date
-        )
+        Prediction.match_id.in_(column_index.keys()),
+        Prediction.user_id.in_(row_index.keys())
     ).all()
 
-    return predictions
+    for prediction in predictions:
+        row = row_index.get(prediction.user_id)
+        if row is None:
+            continue
+
+        matrix[row][column_index[prediction.match_id]] = prediction
+        points_per_row[row] += prediction.points or 0
 
+    return matrix, points_per_row
 
-def get_current_game_round():
-    current_time = get_current_datetime_as_object()
-    
+
+def get_game_round_expression():
+    # SQL expression for the (1-indexed) game round of a match, NULL outside of the rounds
+    return case(
+        *[(and_(Match.matchDateTime >= start_date, Match.matchDateTime < end_date), index + 1)
+          for index, (start_date, end_date) in enumerate(get_game_rounds())],
+        else_=None
+    )
+
+
+def get_round_points(db_session):
+    """Points per game round and user as {round (1-indexed): {user_id: points}}.
+
+    Rounds that are frozen are read from the round_results table, only the other rounds
+    are aggregated from the predictions, all with one GROUP BY.
+    """
     round_list = get_game_rounds()
+    round_points = {round_number: {} for round_number in range(1, len(round_list) + 1)}
 
-    for index, round in enumerate(round_list):
-        start_time, end_time = round
-        print("index:", index)
-        print(f"Start-time: {start_time}, end-time: {end_time}")
-        print("current time: ", current_time)
-        print()
+    frozen_rounds = get_frozen_rounds(db_session)
 
+    if frozen_rounds:
+        frozen_results = db_session.query(RoundResult.round, RoundResult.user_id, RoundResult.points).filter(
+            RoundResult.season == leagueSeason,
+            RoundResult.round.in_(frozen_rounds)
+        )
 
-        if start_time <= current_time <= end_time:
-            return index + 1
-        
-    # If we are outside the time window for the rounds, return the last index
-    return index + 1
+        for round_number, user_id, points in frozen_results:
+            round_points[round_number][user_id] = points
+
+    live_rounds = [index for index in range(len(round_list)) if index + 1 not in frozen_rounds]
+
+    if live_rounds:
+        game_round = get_game_round_expression()
+        live_results = db_session.query(
+            Prediction.user_id,
+            game_round,
+            func.coalesce(func.sum(Prediction.points), 0)
+        ).join(
+            Match, Prediction.match_id == Match.id
+        ).filter(
+            or_(*[and_(Match.matchDateTime >= round_list[index][0], Match.matchDateTime < round_list[index][1])
+                  for index in live_rounds])
+        ).group_by(Prediction.user_id, game_round).all()
+
+        for user_id, round_number, points in live_results:
+            round_points[round_number][user_id] = int(points)
+
+    return round_points
+
+
+def get_frozen_rounds(db_session):
+    return {round_number for round_number, in db_session.query(FrozenRound.round).filter(
+        FrozenRound.season == leagueSeason
+    )}
+
+
+def freeze_finished_game_rounds(db_session):
+    """Store the results of game rounds whose date window is over and whose matches are all evaluated.
+
+    Every frozen round gets a row in frozen_rounds, so rounds without predictions aren't
+    checked again. Rows that already exist are skipped, e. g. when two workers freeze the
+    same round at once.
+    """
+    current_time = get_current_datetime_as_object()
+    frozen_rounds = get_frozen_rounds(db_session)
+
+    for index, (start_date, end_date) in enumerate(get_game_rounds()):
+        round_number = index + 1
+        if round_number in frozen_rounds or end_date > current_time:
+            continue
+
+        in_round = and_(Match.matchDateTime >= start_date, Match.matchDateTime < end_date)
+
+        unevaluated_matches = db_session.query(func.count(Match.id)).filter(
+            in_round, Match.predictions_evaluated == 0
+        ).scalar()
+        if unevaluated_matches:
+            continue
+
+        round_results = db_session.query(
+            literal(leagueSeason),
+            literal(round_number),
+            Prediction.user_id,
+            func.coalesce(func.sum(Prediction.points), 0)
+        ).join(
+            Match, Prediction.match_id == Match.id
+        ).filter(in_round).group_by(Prediction.user_id)
+
+        db_session.execute(get_insert_ignore_statement(RoundResult.__table__).from_select(
+            ["season", "round", "user_id", "points"], round_results
+        ))
+        db_session.execute(get_insert_ignore_statement(FrozenRound.__table__).values(
+            season=leagueSeason, round=round_number, frozen_at=current_time
+        ))
+        print(f"Froze results of game round {round_number}")
+
+    db_session.commit()
+
+
+def get_current_game_round():
+    return get_season_calendar(leagueSeason).get_current_round(get_current_datetime_as_object())
         
 
 def get_game_rounds():
-    current_season = int(leagueSeason)   # is the year of the beginning of the season. e.g. season 24/25 current_season is 2024
-    return [
-        (datetime(current_season, 8, 1), datetime(current_season, 9, 30) + timedelta(days=1)),
-        (datetime(current_season, 10, 1), datetime(current_season, 11, 30) + timedelta(days=1)),
-        (datetime(current_season, 12, 1), datetime(current_season + 1, 1, 31) + timedelta(days=1)),
-        (datetime(current_season + 1, 2, 1), datetime(current_season + 1, 3, 31) + timedelta(days=1)),
-        (datetime(current_season + 1, 4, 1), datetime(current_season + 1, 5, 31) + timedelta(days=1))
-    ]
+    # The (start, end) windows of the rounds, loaded once per season, see season_calendar.py
+    return get_season_calendar(leagueSeason).rounds
 
 
 def get_vote_counts(db_session, poll_id):
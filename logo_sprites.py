@@ -0,0 +1,189 @@
+"""Sprite sheets for the team logos.
+
+The logos of each league/season folder (static/<league>/<season>/team-logos) are packed
+into one sprite sheet plus a 2x variant for high-density screens, written to
+static/sprites. A generated stylesheet has a .team-sprite-<team id> class per team, so a
+page shows all logos of a league with one image request. The team_logo macro
+(templates/team_logo.html) uses the sprite if the team has one and falls back to an
+<img> otherwise, e. g. for SVG logos or before the first build.
+
+The sheets are rebuilt after the teams are synced, or with `python logo_sprites.py`.
+PIL is only imported to build them, the app uses this module for the templates only.
+"""
+import json
+import math
+import os
+from collections import defaultdict
+from threading import Lock
+from static_assets import get_asset_path
+
+
+STATIC_FOLDER = "static"
+SPRITES_FOLDER = os.path.join(STATIC_FOLDER, "sprites")
+SPRITES_CSS = os.path.join(SPRITES_FOLDER, "team-logos.css")
+SPRITES_MANIFEST = os.path.join(SPRITES_FOLDER, "team-logos.json")
+
+CELL_SIZE = 50      # Largest size a logo is displayed in (.team-logo-big)
+CELL_PADDING = 1    # Transparent gutter so scaled down logos don't bleed into each other
+SPRITE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Cached manifest of the sprites: (mtime, {"css": ..., "teams": {team_id: sheet}})
+_manifest_cache = None
+_manifest_lock = Lock()
+
+
+def get_sheet_name(icon_path):
+    # static/bl1/2025/team-logos/x.png -> bl1-2025
+    folder = os.path.dirname(icon_path).replace("\\", "/").split("/")
+    return "-".join(part for part in folder if part not in ("", ".", "static", "team-logos"))
+
+
+def draw_sheet(logo_paths, columns, rows, cell_size):
+    from PIL import Image, ImageOps
+
+    sheet = Image.new("RGBA", (columns * cell_size, rows * cell_size), (0, 0, 0, 0))
+    padding = CELL_PADDING * cell_size // CELL_SIZE
+    inner_size = cell_size - 2 * padding
+
+    for index, logo_path in enumerate(logo_paths):
+        with Image.open(logo_path) as logo:
+            logo = ImageOps.contain(logo.convert("RGBA"), (inner_size, inner_size), Image.LANCZOS)
+
+        column, row = index % columns, index // columns
+        x = column * cell_size + (cell_size - logo.width) // 2
+        y = row * cell_size + (cell_size - logo.height) // 2
+        sheet.paste(logo, (x, y), logo)
+
+    return sheet
+
+
+def get_position(index, count):
+    # Percentages of the free space, so the sprites scale with the size of the element
+    return f"{index * 100 / (count - 1):g}%" if count > 1 else "0%"
+
+
+def build_sheet(sheet_name, team_logos):
+    """Write the 1x and 2x sheet for a list of (team_id, logo path), return the CSS rules."""
+    columns = math.ceil(math.sqrt(len(team_logos)))
+    rows = math.ceil(len(team_logos) / columns)
+    logo_paths = [logo_path for _, logo_path in team_logos]
+
+    sheet_paths = {}
+    for scale, suffix in ((1, ""), (2, "@2x")):
+        sheet_path = os.path.join(SPRITES_FOLDER, f"{sheet_name}{suffix}.png")
+        draw_sheet(logo_paths, columns, rows, CELL_SIZE * scale).save(sheet_path, optimize=True)
+        sheet_paths[scale] = get_asset_path(sheet_path, STATIC_FOLDER)
+
+    selectors = ", ".join(f".team-sprite-{team_id}" for team_id, _ in team_logos)
+    rules = [
+        f"{selectors} {{",
+        f'    background-image: url("{sheet_paths[1]}");',
+        f'    background-image: -webkit-image-set(url("{sheet_paths[1]}") 1x, url("{sheet_paths[2]}") 2x);',
+        f'    background-image: image-set(url("{sheet_paths[1]}") 1x, url("{sheet_paths[2]}") 2x);',
+        f"    background-size: {columns * 100}% {rows * 100}%;",
+        "}",
+    ]
+
+    for index, (team_id, _) in enumerate(team_logos):
+        x = get_position(index % columns, columns)
+        y = get_position(index // columns, rows)
+        rules.append(f".team-sprite-{team_id} {{ background-position: {x} {y}; }}")
+
+    return rules
+
+
+def build_team_logo_sprites(teams):
+    """Build the sprite sheets and the stylesheet for the given teams.
+
+    teams is a list of (team_id, teamIconPath). Logos that are missing or can't be
+    packed (e. g. SVG) are left out and keep being shown as <img>.
+    Returns the number of teams in the sprites.
+    """
+    from PIL import Image
+
+    sheets = defaultdict(list)
+
+    for team_id, icon_path in sorted(teams, key=lambda team: team[0]):
+        if icon_path and icon_path.lower().endswith(SPRITE_EXTENSIONS) and os.path.isfile(icon_path):
+            sheets[get_sheet_name(icon_path)].append((team_id, icon_path))
+
+    os.makedirs(SPRITES_FOLDER, exist_ok=True)
+
+    css = ["/* Generated by logo_sprites.py, do not edit */"]
+    manifest = {"css": os.path.relpath(SPRITES_CSS, STATIC_FOLDER).replace("\\", "/"), "teams": {}}
+
+    for sheet_name, team_logos in sorted(sheets.items()):
+        # A broken image is left out instead of failing the whole sheet
+        valid_logos = []
+        for team_id, logo_path in team_logos:
+            try:
+                with Image.open(logo_path) as logo:
+                    logo.verify()
+                valid_logos.append((team_id, logo_path))
+            except (OSError, ValueError) as e:
+                print(f"Skipping logo {logo_path} for the sprites: {e}")
+
+        if not valid_logos:
+            continue
+
+        css.extend(build_sheet(sheet_name, valid_logos))
+        for team_id, _ in valid_logos:
+            manifest["teams"][str(team_id)] = sheet_name
+
+    with open(SPRITES_CSS, "w", encoding="utf-8") as f:
+        f.write("\n".join(css) + "\n")
+
+    # The manifest is written last, templates only switch to the sprites once everything exists
+    tmp_path = SPRITES_MANIFEST + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, SPRITES_MANIFEST)
+
+    print(f"Team logo sprites: {len(manifest['teams'])} teams in {len(sheets)} sheets")
+
+    return len(manifest["teams"])
+
+
+def get_sprites_manifest():
+    """Return the manifest of the current sprites, reloaded when the file changes."""
+    global _manifest_cache
+
+    try:
+        mtime = os.path.getmtime(SPRITES_MANIFEST)
+    except OSError:
+        return None
+
+    with _manifest_lock:
+        if _manifest_cache is None or _manifest_cache[0] != mtime:
+            try:
+                with open(SPRITES_MANIFEST, encoding="utf-8") as f:
+                    _manifest_cache = (mtime, json.load(f))
+            except (OSError, ValueError):
+                return None
+
+        return _manifest_cache[1]
+
+
+def has_team_sprite(team_id):
+    manifest = get_sprites_manifest()
+    return manifest is not None and str(team_id) in manifest["teams"]
+
+
+def team_logo_sprites_css():
+    """Path of the sprite stylesheet relative to the static folder, or None if there are no sprites."""
+    manifest = get_sprites_manifest()
+    return manifest["css"] if manifest and manifest["teams"] else None
+
+
+def register_team_logo_sprites(app):
+    """Add the template globals used by the team_logo macro and the layout."""
+    app.jinja_env.globals["has_team_sprite"] = has_team_sprite
+    app.jinja_env.globals["team_logo_sprites_css"] = team_logo_sprites_css
+
+
+if __name__ == "__main__":
+    from config import get_db_session
+    from models import Team
+
+    with get_db_session() as db_session:
+        build_team_logo_sprites(db_session.query(Team.id, Team.teamIconPath).all())
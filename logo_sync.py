@@ -0,0 +1,286 @@
+"""Incremental download of the team logos.
+
+A manifest (logo-manifest.json next to this file, path configurable with
+LOGO_MANIFEST_PATH) records for every logo file the URL it was downloaded from and the
+hashes of the downloaded and the resized image. It is kept outside the static folder, so
+it isn't served. A logo is only
+downloaded if its file is missing, was changed on disk or the team's icon URL changed,
+so a rerun without changes doesn't touch the network.
+
+Downloads and resizing run in thread pools. `python logo_sync.py` syncs the logos of all
+teams in the database and resizes in worker processes instead, which the web workers must
+not start. Identical images (the same
+club in several leagues and seasons) are downloaded once per URL and resized once per
+content hash, and the files are hard-linked to one copy on disk where possible.
+"""
+import hashlib
+import io
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from PIL import Image
+
+
+MANIFEST_PATH = os.getenv(
+    "LOGO_MANIFEST_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo-manifest.json")
+)
+# Where the manifest was kept before, it is moved on the next sync
+LEGACY_MANIFEST_PATH = os.path.join("static", "logo-manifest.json")
+MAX_DOWNLOAD_WORKERS = 8
+MAX_RESIZE_WORKERS = 4
+MIN_IMAGES_FOR_RESIZE_POOL = 4      # Starting a pool isn't worth it for a few images
+REQUEST_TIMEOUT_SECONDS = 20
+LOGO_MAX_SIZE = (100, 100)
+RESIZABLE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+### Header from chatGPT to mimic a real computer
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.102 Safari/537.36",
+    "Referer": "https://www.google.com/",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Cache-Control": "no-cache",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+
+def get_content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return get_content_hash(f.read())
+    except OSError:
+        return None
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    for path in (manifest_path, LEGACY_MANIFEST_PATH):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            continue
+
+    return {"files": {}}
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True, ensure_ascii=False)
+
+    os.replace(tmp_path, manifest_path)
+
+    # Don't leave the old copy in the static folder, where it is served
+    if os.path.abspath(manifest_path) != os.path.abspath(LEGACY_MANIFEST_PATH):
+        try:
+            os.remove(LEGACY_MANIFEST_PATH)
+        except OSError:
+            pass
+
+
+def resize_logo(content, extension, max_size=LOGO_MAX_SIZE):
+    """ For faster load times of the page, it is useful to lower the resolution of the pictures """
+    if extension.lower() not in RESIZABLE_EXTENSIONS:
+        return content
+
+    with Image.open(io.BytesIO(content)) as image:
+        image_format = image.format
+        # Resize the image while maintaining the aspect ratio
+        image.thumbnail(max_size)
+
+        output = io.BytesIO()
+        image.save(output, format=image_format)
+
+    return output.getvalue()
+
+
+def try_resize_logo(content, extension):
+    # Runs in the pool, a broken image must not fail the other ones
+    try:
+        return resize_logo(content, extension)
+    except (OSError, ValueError) as e:
+        print(f"Failed to resize logo. Error: {e}")
+        return None
+
+
+def download_logo(url):
+    """Download one logo, returns the content or None if the download failed."""
+    try:
+        response = requests.get(
+            url,
+            cookies={"session": str(uuid.uuid4())},
+            headers=REQUEST_HEADERS,
+            timeout=REQUEST_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return response.content
+
+    except requests.RequestException as e:
+        print(f"Failed to download logo from {url}. Error: {e}")
+        return None
+
+
+def write_file(path, content=None, link_from=None):
+    """Atomically replace path with content, or with a hard link to link_from.
+
+    Falls back to writing the content if the file system doesn't support hard links.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    if link_from:
+        try:
+            os.link(link_from, tmp_path)
+            os.replace(tmp_path, path)
+            return
+        except OSError:
+            with open(link_from, "rb") as f:
+                content = f.read()
+
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(entry, path, url):
+    return entry is not None and entry.get("url") == url and get_file_hash(path) == entry.get("hash")
+
+
+def sync_logos(logos, manifest_path=MANIFEST_PATH, use_processes=False):
+    """Download and resize the logos that are missing or changed.
+
+    logos is a list of (url, file path) tuples. With use_processes the images are resized
+    in worker processes, only for the command line, not inside a web worker. Returns a dict
+    with the number of downloaded, resized, linked, skipped and failed logos.
+    """
+    counts = {"downloaded": 0, "resized": 0, "linked": 0, "skipped": 0, "failed": 0}
+    manifest = load_manifest(manifest_path)
+    files = manifest.setdefault("files", {})
+
+    pending = []
+    for url, path in logos:
+        entry = files.get(path)
+
+        if is_up_to_date(entry, path, url):
+            counts["skipped"] += 1
+            continue
+
+        if entry is None and os.path.exists(path):
+            # Logos from before the manifest existed are adopted as they are
+            files[path] = {"url": url, "source_hash": None, "hash": get_file_hash(path)}
+            counts["skipped"] += 1
+            continue
+
+        pending.append((url, path))
+
+    if not pending:
+        save_manifest(manifest, manifest_path)
+        print(f"Logos: {counts['skipped']} up to date")
+        return counts
+
+    # Download every URL only once, even if several files use it
+    urls = list(dict.fromkeys(url for url, _ in pending))
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        downloads = dict(zip(urls, executor.map(download_logo, urls)))
+    counts["downloaded"] = sum(1 for content in downloads.values() if content is not None)
+
+    # Files already on disk per resized hash and source hash, to link instead of resizing again
+    path_by_hash = {}
+    resized_hash_by_source_hash = {}
+    for path, entry in files.items():
+        if entry.get("hash") and get_file_hash(path) == entry["hash"]:
+            path_by_hash.setdefault(entry["hash"], path)
+            if entry.get("source_hash"):
+                resized_hash_by_source_hash[entry["source_hash"]] = entry["hash"]
+
+    # Resize every distinct image once
+    to_resize = {}
+    for url, path in pending:
+        content = downloads[url]
+        if content is None:
+            continue
+
+        source_hash = get_content_hash(content)
+        extension = os.path.splitext(path)[1]
+        if source_hash not in resized_hash_by_source_hash and (source_hash, extension) not in to_resize:
+            to_resize[(source_hash, extension)] = content
+
+    resized = {}
+    if to_resize:
+        keys = list(to_resize.keys())
+        contents = [to_resize[key] for key in keys]
+        extensions = [extension for _, extension in keys]
+
+        if len(keys) < MIN_IMAGES_FOR_RESIZE_POOL:
+            results = list(map(try_resize_logo, contents, extensions))
+        elif use_processes:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=MAX_RESIZE_WORKERS) as executor:
+                results = list(executor.map(try_resize_logo, contents, extensions))
+        else:
+            # Pillow releases the GIL while decoding and resizing
+            with ThreadPoolExecutor(max_workers=MAX_RESIZE_WORKERS) as executor:
+                results = list(executor.map(try_resize_logo, contents, extensions))
+
+        resized = dict(zip(keys, results))
+        counts["resized"] = sum(1 for content in results if content is not None)
+
+    # Write the files, hard-linking identical images to one copy
+    for url, path in pending:
+        content = downloads[url]
+        if content is None:
+            counts["failed"] += 1
+            continue
+
+        source_hash = get_content_hash(content)
+        extension = os.path.splitext(path)[1]
+        resized_hash = resized_hash_by_source_hash.get(source_hash)
+
+        if resized_hash and resized_hash in path_by_hash:
+            write_file(path, link_from=path_by_hash[resized_hash])
+            counts["linked"] += 1
+        else:
+            resized_content = resized.get((source_hash, extension))
+            if resized_content is None:
+                counts["failed"] += 1
+                continue
+
+            resized_hash = get_content_hash(resized_content)
+            if resized_hash in path_by_hash:
+                write_file(path, link_from=path_by_hash[resized_hash])
+                counts["linked"] += 1
+            else:
+                write_file(path, content=resized_content)
+
+        path_by_hash.setdefault(resized_hash, path)
+        resized_hash_by_source_hash[source_hash] = resized_hash
+        files[path] = {"url": url, "source_hash": source_hash, "hash": resized_hash}
+
+    save_manifest(manifest, manifest_path)
+
+    print(f"Logos: {counts['downloaded']} downloaded, {counts['resized']} resized, {counts['linked']} linked, "
+          f"{counts['skipped']} up to date, {counts['failed']} failed")
+
+    return counts
+
+
+if __name__ == "__main__":
+    from config import get_db_session
+    from models import Team
+
+    with get_db_session() as db_session:
+        teams = db_session.query(Team.teamIconUrl, Team.teamIconPath).all()
+
+    sync_logos([(url, path) for url, path in teams if url and path], use_processes=True)
@@ -0,0 +1,314 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+The metrics are kept in memory by every worker process and served at /metrics, so they
+can be scraped (or just opened with curl) without any external service:
+
+- http_request_duration_seconds: latency histogram per route, method and status
+- db_pool_checkout_wait_seconds, db_pool_connections_in_use, ...: the SQLAlchemy pool
+- openliga_request_duration_seconds, openliga_requests_total: calls to the OpenLigaDB API
+- background_update_duration_seconds, background_updates_total: full and live updates
+- last_successful_sync_timestamp_seconds, seconds_since_last_successful_sync
+
+/metrics only answers requests from the local machine, unless METRICS_TOKEN is set, then
+it requires that token ("Authorization: Bearer <token>" or ?token=<token>).
+"""
+import hmac
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, abort, g, request
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+UPDATE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self):
+        """Return the sample lines of this metric"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.collect())
+        return lines
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in values]
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        # Gauges without labels can read their value at scrape time instead
+        self._function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def collect(self):
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [f"{self.name} {format_value(value)}"]
+
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in values]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket (not cumulative), sum, count]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Time to handle a request", ("route", "method", "status"))
+
+DB_POOL_CHECKOUT_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a connection from the pool", buckets=POOL_WAIT_BUCKETS)
+DB_POOL_CHECKOUT_TIMEOUTS = registry.counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that failed because the pool was exhausted")
+DB_POOL_IN_USE = registry.gauge("db_pool_connections_in_use", "Connections currently checked out of the pool")
+DB_POOL_IDLE = registry.gauge("db_pool_connections_idle", "Open connections waiting in the pool")
+DB_POOL_OVERFLOW = registry.gauge("db_pool_overflow", "Connections beyond the pool size (negative: unused slots)")
+
+OPENLIGA_DURATION = registry.histogram(
+    "openliga_request_duration_seconds", "Duration of OpenLigaDB API calls", ("endpoint", "result"))
+OPENLIGA_ERRORS = registry.counter(
+    "openliga_request_errors_total", "Failed OpenLigaDB API calls", ("endpoint", "reason"))
+
+BACKGROUND_UPDATE_DURATION = registry.histogram(
+    "background_update_duration_seconds", "Duration of the background updates", ("kind",), buckets=UPDATE_BUCKETS)
+BACKGROUND_UPDATES = registry.counter(
+    "background_updates_total", "Finished background updates", ("kind", "result"))
+
+_last_successful_sync = None
+
+LAST_SUCCESSFUL_SYNC = registry.gauge(
+    "last_successful_sync_timestamp_seconds", "Unix time of the last sync that fetched all leagues",
+    function=lambda: _last_successful_sync)
+SECONDS_SINCE_LAST_SUCCESSFUL_SYNC = registry.gauge(
+    "seconds_since_last_successful_sync", "Seconds since the last sync that fetched all leagues",
+    function=lambda: None if _last_successful_sync is None else time.time() - _last_successful_sync)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def register_pool_metrics(engine):
+    """Read the connection counts of the engine's pool at scrape time"""
+
+    def pool_stat(name):
+        # The pool is replaced on engine.dispose(), so it's looked up on every scrape
+        def read():
+            method = getattr(engine.pool, name, None)
+            return method() if method is not None else None
+        return read
+
+    DB_POOL_IN_USE.set_function(pool_stat("checkedout"))
+    DB_POOL_IDLE.set_function(pool_stat("checkedin"))
+    DB_POOL_OVERFLOW.set_function(pool_stat("overflow"))
+
+
+def record_successful_sync():
+    global _last_successful_sync
+    _last_successful_sync = time.time()
+
+
+@contextmanager
+def track_background_update(kind):
+    """Record the duration and outcome of a background update ("full" or "live")"""
+    start = time.perf_counter()
+    result = "error"
+    try:
+        yield
+        result = "ok"
+    finally:
+        BACKGROUND_UPDATE_DURATION.observe(time.perf_counter() - start, kind=kind)
+        BACKGROUND_UPDATES.inc(kind=kind, result=result)
+
+
+def is_metrics_request_allowed():
+    if METRICS_TOKEN:
+        authorization = request.headers.get("Authorization", "")
+        token = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else request.args.get("token", "")
+        return hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
+def metrics_view():
+    if not is_metrics_request_allowed():
+        abort(403)
+
+    response = Response(registry.render(), mimetype="text/plain")
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
+
+def register_metrics(app):
+    """Time every request and add the /metrics route"""
+
+    @app.before_request
+    def metrics_before_request():
+        g.metrics_start_time = time.perf_counter()
+
+    @app.after_request
+    def metrics_after_request(response):
+        start = g.pop("metrics_start_time", None)
+
+        if start is not None:
+            # The rule (e. g. /rangliste/<int:round>) instead of the path keeps the number of series small
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            REQUEST_DURATION.observe(time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+
+        return response
+
+    app.add_url_rule("/metrics", endpoint="metrics", view_func=metrics_view)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -164,6 +164,69 @@ class Prediction(Base):
         return f"<Prediction(id={self.id}, user_id={self.user_id}, match_id={self.match_id})>"
 
 
+class UserStats(Base):
+    """Statistics per user for the home and statistics page, maintained by the scoring pipeline"""
+    __tablename__ = 'user_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer)
+    no_users = Column(Integer, default=0)
+    leader = Column(String(255))
+    total_points = Column(Integer, default=0)
+    predictions_rated = Column(Integer, default=0)
+    total_games_predicted = Column(Integer, default=0)
+    missed_games = Column(Integer, default=0)
+    corr_result = Column(Integer, default=0)
+    corr_goal_diff = Column(Integer, default=0)
+    corr_tendency = Column(Integer, default=0)
+    wrong_predictions = Column(Integer, default=0)
+    corr_result_p = Column(Integer, default=0)
+    corr_goal_diff_p = Column(Integer, default=0)
+    corr_tendency_p = Column(Integer, default=0)
+    wrong_predictions_p = Column(Integer, default=0)
+    points_per_tip = Column(Float, default=0)
+    updated_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<UserStats(user_id={self.user_id}, rank={self.rank})>"
+
+
+class RoundResult(Base):
+    """Points of a user in a game round that is over and fully evaluated. Written once, never updated."""
+    __tablename__ = 'round_results'
+
+    season = Column(String(4), primary_key=True)
+    round = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    points = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<RoundResult(season={self.season}, round={self.round}, user_id={self.user_id}, points={self.points})>"
+
+
+class FrozenRound(Base):
+    """Game round whose results were stored in round_results, also when nobody predicted any of its matches"""
+    __tablename__ = 'frozen_rounds'
+
+    season = Column(String(4), primary_key=True)
+    round = Column(Integer, primary_key=True)
+    frozen_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<FrozenRound(season={self.season}, round={self.round})>"
+
+
+class DataVersion(Base):
+    """Counter raised with every change shown on the cached pages, shared by all worker processes"""
+    __tablename__ = 'data_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DataVersion(version={self.version})>"
+
+
 class UserVote(Base):
     __tablename__ = 'user_votes'
     
@@ -180,4 +243,7 @@ class UserVote(Base):
 Index('ix_user_username', User.username)
 Index('ix_user_email', User.email)
 Index('ix_match_team1_id', Match.team1_id)
-Index('ix_match_team2_id', Match.team2_id)
\ No newline at end of file
+Index('ix_match_team2_id', Match.team2_id)
+
+# One prediction per user and match, submitting twice updates it
+Index('uq_prediction_user_match', Prediction.user_id, Prediction.match_id, unique=True)
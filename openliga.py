@@ -0,0 +1,143 @@
+"""Client for the OpenLigaDB API.
+
+All requests go through one keep-alive session with a connection pool, so repeated
+calls reuse open connections. Several URLs can be fetched concurrently with a bounded
+number of workers. If the API sends an ETag or Last-Modified header, the next request
+for the same URL is made conditional and a 304 answer returns the cached JSON.
+
+The duration and the failures of every call are recorded in the metrics (/metrics),
+labeled with the API endpoint, e. g. "getmatchdata", and as a span of the current trace.
+
+requests is imported on the first call, so starting the app doesn't load the HTTP client.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import urlsplit
+from metrics import OPENLIGA_DURATION, OPENLIGA_ERRORS
+from tracing import span, wrap_context
+
+
+MAX_WORKERS = 8                 # Concurrent requests for bulk fetches
+POOL_SIZE = 10                  # Keep-alive connections per host
+REQUEST_TIMEOUT_SECONDS = 10
+
+_session = None
+_executor = None
+_setup_lock = Lock()
+
+# url -> (etag, last_modified, json) of the last successful response
+_conditional_cache = {}
+_conditional_cache_lock = Lock()
+
+
+def get_session():
+    """Return the shared requests session, creating it on first use."""
+    global _session
+
+    if _session is None:
+        with _setup_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+
+    return _session
+
+
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        with _setup_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="openliga")
+
+    return _executor
+
+
+def get_endpoint(url):
+    # https://api.openligadb.de/getmatchdata/bl1/2025 -> getmatchdata
+    parts = urlsplit(url).path.strip("/").split("/")
+    return parts[0] or "unknown"
+
+
+def get_json(url):
+    """Fetch a URL and return the decoded JSON, or None if the request failed."""
+    # Only part of the update traces, calls from scripts don't start traces of their own
+    with span("openliga.get_json", root=False, url=url) as request_span:
+        return _fetch_json(url, request_span)
+
+
+def _fetch_json(url, request_span):
+    import requests
+
+    with _conditional_cache_lock:
+        cached = _conditional_cache.get(url)
+
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    endpoint = get_endpoint(url)
+    start = time.perf_counter()
+    result = "error"
+
+    try:
+        response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+
+        if response.status_code == 304 and cached:
+            result = "not_modified"
+            return cached[2]
+
+        response.raise_for_status()
+        data = response.json()
+        result = "ok"
+
+    except requests.Timeout:
+        OPENLIGA_ERRORS.inc(endpoint=endpoint, reason="timeout")
+        return None
+    except requests.ConnectionError:
+        OPENLIGA_ERRORS.inc(endpoint=endpoint, reason="connection")
+        return None
+    except requests.HTTPError:
+        OPENLIGA_ERRORS.inc(endpoint=endpoint, reason="http_status")
+        return None
+    except (KeyError, IndexError, requests.RequestException, ValueError):
+        OPENLIGA_ERRORS.inc(endpoint=endpoint, reason="invalid_response")
+        return None
+
+    finally:
+        OPENLIGA_DURATION.observe(time.perf_counter() - start, endpoint=endpoint, result=result)
+        request_span.set_attribute("result", result)
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+
+    if etag or last_modified:
+        with _conditional_cache_lock:
+            _conditional_cache[url] = (etag, last_modified, data)
+
+    return data
+
+
+def get_json_many(urls):
+    """Fetch several URLs concurrently.
+
+    Returns a dict mapping each url to its JSON (or None if the request failed).
+    """
+    urls = list(dict.fromkeys(urls))
+
+    if len(urls) <= 1:
+        return {url: get_json(url) for url in urls}
+
+    return dict(zip(urls, _get_executor().map(wrap_context(get_json), urls)))
@@ -0,0 +1,149 @@
+"""Statistics about the SQL statements of each request.
+
+Listens to the cursor events of all SQLAlchemy engines and records per request the
+number of statements, the total time spent in the database and the slowest statements.
+They are logged at debug level and sent as X-DB-Queries and Server-Timing headers
+(visible in the browser's network tab), but only in debug mode, with QUERY_STATS_HEADERS=1
+or to the users listed in ADMIN_USER_IDS, since they expose internal timings.
+
+assert_max_queries() checks that a piece of code (e. g. a request with the test client)
+stays within a query budget:
+
+    with assert_max_queries(8):
+        client.get("/rangliste")
+"""
+import heapq
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from helpers import is_admin
+
+
+SLOWEST_STATEMENTS = 5
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "0") == "1"
+
+# Collectors of assert_max_queries() that are active in this thread
+_local = threading.local()
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = []    # All statements, only kept for assert_max_queries()
+        self._slowest = []      # Heap of (duration, index, statement)
+
+    def record(self, statement, duration, keep_statements=False):
+        self.count += 1
+        self.total_time += duration
+
+        if keep_statements:
+            self.statements.append(statement)
+
+        entry = (duration, self.count, statement)
+        if len(self._slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        """The slowest statements as (duration, statement), slowest first"""
+        return [(duration, statement) for duration, _, statement in sorted(self._slowest, reverse=True)]
+
+
+def get_request_query_stats():
+    """Statistics of the current request, or None outside of a request"""
+    if not has_request_context():
+        return None
+
+    if "query_stats" not in g:
+        g.query_stats = QueryStats()
+
+    return g.query_stats
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+
+    request_stats = get_request_query_stats()
+    if request_stats is not None:
+        request_stats.record(statement, duration)
+
+    for collector in getattr(_local, "collectors", []):
+        collector.record(statement, duration, keep_statements=True)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # Failed statements don't reach after_cursor_execute
+    start_times = context.connection.info.get("query_start_time") if context.connection is not None else None
+    if start_times:
+        start_times.pop()
+
+
+@contextmanager
+def collect_queries():
+    """Record the statements executed in this thread while the block runs"""
+    collector = QueryStats()
+
+    if not hasattr(_local, "collectors"):
+        _local.collectors = []
+
+    _local.collectors.append(collector)
+    try:
+        yield collector
+    finally:
+        _local.collectors.remove(collector)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """Fail with an AssertionError listing the statements if the block runs more than max_queries"""
+    with collect_queries() as collector:
+        yield collector
+
+    if collector.count > max_queries:
+        statements = "\n".join(f"{index}. {statement}" for index, statement in enumerate(collector.statements, start=1))
+        raise AssertionError(f"Expected at most {max_queries} queries, got {collector.count}:\n{statements}")
+
+
+def add_query_stats_headers(response):
+    stats = get_request_query_stats()
+
+    if stats is None or not stats.count:
+        return response
+
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["Server-Timing"] = f'db;dur={stats.total_time * 1000:.1f};desc="{stats.count} queries"'
+
+    return response
+
+
+def register_query_stats(app):
+    """Log the query statistics of each request, and send them with the response where allowed"""
+
+    @app.after_request
+    def query_stats_after_request(response):
+        stats = get_request_query_stats()
+
+        if stats is None or not stats.count:
+            return response
+
+        slowest = "\n".join(f"  {duration * 1000:.1f} ms: {statement}" for duration, statement in stats.slowest)
+        app.logger.debug(f"{request.path}: {stats.count} queries in {stats.total_time * 1000:.1f} ms, slowest:\n{slowest}")
+
+        if app.debug or QUERY_STATS_HEADERS or is_admin():
+            add_query_stats_headers(response)
+
+        return response
@@ -0,0 +1,93 @@
+"""Process-wide snapshot of the teams and the match schedule.
+
+Teams and matches only change when a sync runs, so the pages read them from one
+snapshot per process instead of querying them (and the teams of every match) on each
+request. The snapshot holds detached Match and Team objects with their teams already
+loaded. They are shared between requests and must be treated as read-only.
+
+The snapshot is rebuilt as a whole and swapped in atomically when the update times of
+the matches or teams in the data version changed, e. g. because a worker ran the sync.
+Scoring runs and new users change the data version too, but not the snapshot:
+- right away when a route passes a data version with other update times,
+- otherwise when a check every REFERENCE_DATA_TTL_SECONDS finds other update times.
+"""
+import time
+from bisect import bisect_left
+from threading import Lock
+from sqlalchemy.orm import joinedload
+from config import new_db_session
+from models import Match, Team
+from render_cache import get_data_version
+
+
+REFERENCE_DATA_TTL_SECONDS = 10
+
+_snapshot = None
+_snapshot_lock = Lock()
+
+
+def get_reference_version(data_version):
+    # The last match and team update times of the data version, see render_cache.get_data_version
+    return data_version[2:4]
+
+
+class ReferenceData:
+    def __init__(self, teams, matches, data_version):
+        self.teams = {team.id: team for team in teams}
+        self.matches = tuple(sorted(matches, key=lambda match: match.matchDateTime))
+        self.matches_by_id = {match.id: match for match in self.matches}
+        self._match_times = [match.matchDateTime for match in self.matches]
+
+        # Same order as ORDER BY teamRank ASC, teams without rank first
+        self.league_table = tuple(sorted(teams, key=lambda team: (team.teamRank is not None, team.teamRank or 0)))
+
+        self.reference_version = get_reference_version(data_version)
+        self.checked_at = time.monotonic()
+
+    def __repr__(self):
+        return f"<ReferenceData(teams={len(self.teams)}, matches={len(self.matches)})>"
+
+    def get_matches_between(self, start_date, end_date):
+        """Matches with start_date <= matchDateTime < end_date, ordered by kickoff"""
+        start = bisect_left(self._match_times, start_date)
+        end = bisect_left(self._match_times, end_date)
+        return list(self.matches[start:end])
+
+
+def build_reference_data():
+    """Load all teams and matches into a new snapshot"""
+    with new_db_session() as db_session:
+        # The version is read first, a sync running meanwhile only causes one more rebuild
+        data_version = get_data_version(db_session)
+        teams = db_session.query(Team).all()
+        matches = db_session.query(Match).options(joinedload(Match.team1), joinedload(Match.team2)).all()
+
+    return ReferenceData(teams, matches, data_version)
+
+
+def get_reference_data(db_session, data_version=None):
+    """Return the current snapshot, rebuilding it if it's outdated.
+
+    Routes that already queried the data version pass it, so the snapshot always
+    matches the match and team update times their pages are cached under.
+    """
+    global _snapshot
+
+    snapshot = _snapshot
+
+    if snapshot is not None:
+        if data_version is None and time.monotonic() - snapshot.checked_at >= REFERENCE_DATA_TTL_SECONDS:
+            data_version = get_data_version(db_session)
+
+        if data_version is None or get_reference_version(data_version) == snapshot.reference_version:
+            snapshot.checked_at = time.monotonic()
+            return snapshot
+
+    with _snapshot_lock:
+        # Another request may have rebuilt it while this one waited
+        if _snapshot is not snapshot and (
+                data_version is None or get_reference_version(data_version) == _snapshot.reference_version):
+            return _snapshot
+
+        _snapshot = build_reference_data()
+        return _snapshot
@@ -0,0 +1,146 @@
+"""In-process cache for the rendered leaderboard pages.
+
+Pages are cached under (page, game round, data version, ...) keys with bounded size and
+LRU eviction. The data version is read from the database: a counter in the data_version
+table, which the scoring, the syncs and account changes raise, plus the update timestamps
+of matches and teams and the number of users. So all worker processes see the same
+version and changes made by one of them invalidate the pages of the others as well.
+Cached pages are rendered without a current user, the current user's row is applied
+per request. Cached values are plain data, no ORM objects.
+
+The same state is used for the ETags of these pages, so a browser revalidating an
+unchanged page gets a 304 answer without any template being rendered.
+"""
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from flask import make_response, request
+from sqlalchemy import func
+from models import User, Match, Team, Prediction, DataVersion
+
+
+MAX_ENTRIES = 64
+
+
+class RenderCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+render_cache = RenderCache()
+
+
+def bump_data_version(db_session):
+    """Invalidate the cached pages of all worker processes, called with scoring, syncs and account changes.
+
+    Does not commit, the new version becomes visible together with the change.
+    """
+    db_session.query(DataVersion).filter(DataVersion.id == 1).update({
+        DataVersion.version: DataVersion.version + 1
+    }, synchronize_session=False)
+
+
+def get_data_version(db_session):
+    # One cheap query for the state the leaderboard pages are rendered from
+    return tuple(db_session.query(
+        db_session.query(DataVersion.version).filter(DataVersion.id == 1).scalar_subquery(),
+        db_session.query(func.max(Match.evaluation_Date)).scalar_subquery(),
+        db_session.query(func.max(Match.lastUpdateDateTime)).scalar_subquery(),
+        db_session.query(func.max(Team.lastUpdateTime)).scalar_subquery(),
+        db_session.query(func.count(User.id)).scalar_subquery()
+    ).one())
+
+
+def get_user_predictions_version(db_session, user_id, match_ids):
+    # Changes whenever the user adds, changes or deletes a prediction for one of the matches
+    return db_session.query(
+        func.count(Prediction.id),
+        func.max(Prediction.id),
+        func.max(Prediction.prediction_date)
+    ).filter(
+        Prediction.user_id == user_id,
+        Prediction.match_id.in_(match_ids)
+    ).one()
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def get_last_modified(*timestamps):
+    """Return the latest of the given (naive, local) timestamps as an aware datetime, or None."""
+    timestamps = [timestamp for timestamp in timestamps if isinstance(timestamp, datetime)]
+
+    if not timestamps:
+        return None
+
+    return max(timestamps).astimezone()
+
+
+def conditional_response(etag, last_modified, render):
+    """Answer with 304 if the client already has this version of the page, otherwise call render().
+
+    The pages also change with the clock (kickoffs) and with renames, which Last-Modified
+    can't express, so only the ETag decides. Pages stay private and are always revalidated.
+    """
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    return response
+
+
+def get_cached_view(key, render):
+    """Return the cached value for key, calling render() to create it on a miss."""
+    value = render_cache.get(key)
+
+    if value is None:
+        value = render()
+        render_cache.set(key, value)
+
+    return value
+
+
+def replace_user_row(html, user_id, row_html=None):
+    """Replace the <tr data-user-id="..."> row of the user with row_html.
+
+    Without row_html the row is only highlighted with the table-primary class.
+    """
+    row_start = f'<tr data-user-id="{user_id}"'
+    start = html.find(row_start)
+
+    if start == -1:
+        return html
+
+    if row_html is None:
+        return html[:start] + row_start + ' class="table-primary"' + html[start + len(row_start):]
+
+    end = html.find("</tr>", start) + len("</tr>")
+    return html[:start] + row_html + html[end:]
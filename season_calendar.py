@@ -0,0 +1,119 @@
+"""Game rounds of a season.
+
+A season is split into game rounds, date windows [start, end) the leaderboard is
+grouped by. The windows are read once per season from the JSON file at
+SEASON_CALENDAR_PATH (default: season_calendar.json next to this module), e. g.
+
+    {
+        "2025": [
+            {"start": "2025-08-01", "end": "2025-10-01"},
+            {"start": "2025-10-01", "end": "2025-12-01"}
+        ]
+    }
+
+Seasons that aren't in the file use the default windows (Aug-Sep, Oct-Nov, Dec-Jan,
+Feb-Mar, Apr-May). Lookups of the round of a point in time use bisect on the sorted
+round starts.
+"""
+import json
+import logging
+import os
+from bisect import bisect_right
+from datetime import datetime
+from threading import Lock
+
+
+SEASON_CALENDAR_PATH = os.getenv(
+    "SEASON_CALENDAR_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "season_calendar.json")
+)
+
+_calendars = {}
+_calendars_lock = Lock()
+
+logger = logging.getLogger("season_calendar")
+
+
+class SeasonCalendar:
+    def __init__(self, season, rounds):
+        self.season = str(season)
+        # Tuple of (start, end) per round, ordered by start, shared by all callers
+        self.rounds = tuple(sorted(rounds))
+        self._starts = [start for start, _ in self.rounds]
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def __repr__(self):
+        return f"<SeasonCalendar(season={self.season}, rounds={len(self.rounds)})>"
+
+    def get_bounds(self, round_number):
+        """Return (start, end) of a (1-indexed) round"""
+        if round_number < 1 or round_number > len(self.rounds):
+            raise IndexError("Invalid index for game rounds.")
+
+        return self.rounds[round_number - 1]
+
+    def get_round(self, moment):
+        """Return the (1-indexed) round that contains the moment, or None outside of the rounds"""
+        index = bisect_right(self._starts, moment) - 1
+
+        if index >= 0 and moment < self.rounds[index][1]:
+            return index + 1
+
+        return None
+
+    def get_current_round(self, now):
+        # Outside of the rounds (e. g. summer break) the last round is shown
+        return self.get_round(now) or len(self.rounds)
+
+
+def get_default_rounds(season):
+    current_season = int(season)   # is the year of the beginning of the season. e.g. season 24/25 current_season is 2024
+    return [
+        (datetime(current_season, 8, 1), datetime(current_season, 10, 1)),
+        (datetime(current_season, 10, 1), datetime(current_season, 12, 1)),
+        (datetime(current_season, 12, 1), datetime(current_season + 1, 2, 1)),
+        (datetime(current_season + 1, 2, 1), datetime(current_season + 1, 4, 1)),
+        (datetime(current_season + 1, 4, 1), datetime(current_season + 1, 6, 1))
+    ]
+
+
+def load_rounds(season, path=SEASON_CALENDAR_PATH):
+    """Read the rounds of a season from the calendar file, None if it isn't configured there.
+
+    A file that can't be read or parsed is logged and also returns None, so the default
+    rounds are used instead of failing every page that needs the current round.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            calendar = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Reading the season calendar {path} failed, using the default rounds: {e}")
+        return None
+
+    try:
+        rounds = calendar.get(str(season))
+        if not rounds:
+            return None
+
+        return [(datetime.fromisoformat(round["start"]), datetime.fromisoformat(round["end"])) for round in rounds]
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        logger.error(f"Invalid rounds for season {season} in the season calendar {path}, using the default rounds: {e!r}")
+        return None
+
+
+def get_season_calendar(season):
+    """Return the calendar of a season, loaded on first use"""
+    calendar = _calendars.get(season)
+
+    if calendar is None:
+        with _calendars_lock:
+            calendar = _calendars.get(season)
+            if calendar is None:
+                calendar = SeasonCalendar(season, load_rounds(season) or get_default_rounds(season))
+                _calendars[season] = calendar
+
+    return calendar
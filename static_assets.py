@@ -0,0 +1,210 @@
+"""Fingerprinted URLs for the files in the static folder.
+
+Templates call asset_url("styles.css") (or pass a team's teamIconPath) and get a URL
+containing a hash of the file content, e. g. /assets/3f2a9c1b0d4e/styles.css. Since the
+URL changes whenever the file changes, these responses are served with a one-year
+max-age and "immutable", so browsers don't request them again.
+
+Text assets can be precompressed with `python static_assets.py`, which writes .gz (and
+.br, if the brotli package is installed) files next to them. They are sent instead of
+the original to clients accepting that encoding.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat
+import sys
+from threading import Lock
+from flask import abort, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_MAX_AGE_SECONDS = 365 * 24 * 3600
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".html")
+
+# Precompressed variants in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# Full path -> (mtime, size, fingerprint)
+_fingerprints = {}
+_fingerprints_lock = Lock()
+
+_static_folder = None
+
+
+def normalize_asset_path(path):
+    """Return the path relative to the static folder, also for "static/..." or "/static/..." paths."""
+    path = path.replace("\\", "/").lstrip("/")
+
+    if path.startswith("static/"):
+        path = path[len("static/"):]
+
+    return path
+
+
+def get_fingerprint(filename, static_folder=None):
+    """Return the content hash of a static file, or None if it doesn't exist.
+
+    Only regular files inside the static folder are hashed. Hashes are cached and only
+    recomputed when the file's mtime or size change.
+    """
+    full_path = safe_join(static_folder or _static_folder, filename)
+    if full_path is None:
+        return None
+
+    try:
+        file_stat = os.stat(full_path)
+    except OSError:
+        return None
+
+    if not stat.S_ISREG(file_stat.st_mode):
+        return None
+
+    with _fingerprints_lock:
+        cached = _fingerprints.get(full_path)
+
+    if cached and cached[0] == file_stat.st_mtime and cached[1] == file_stat.st_size:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(full_path, "rb") as file:
+        for chunk in iter(lambda: file.read(65536), b""):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+    with _fingerprints_lock:
+        _fingerprints[full_path] = (file_stat.st_mtime, file_stat.st_size, fingerprint)
+
+    return fingerprint
+
+
+def asset_url(path):
+    """URL of a static file with its content hash, falls back to the plain static URL."""
+    if not path:
+        return path
+
+    filename = normalize_asset_path(path)
+    fingerprint = get_fingerprint(filename)
+
+    if fingerprint is None:
+        return url_for("static", filename=filename)
+
+    return url_for("asset", fingerprint=fingerprint, filename=filename)
+
+
+def get_asset_path(filename, static_folder):
+    """Fingerprinted URL path of a static file without an app context, e. g. for generated CSS."""
+    filename = normalize_asset_path(filename)
+    return f"/assets/{get_fingerprint(filename, static_folder)}/{filename}"
+
+
+def get_precompressed_variant(filename, full_path):
+    """Return (encoding, filename) of the best precompressed variant the client accepts, or None.
+
+    full_path is the already resolved path of filename in the static folder.
+    """
+    if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+        return None
+
+    for encoding, extension in ENCODINGS:
+        if encoding not in request.accept_encodings:
+            continue
+
+        try:
+            # Ignore variants that are older than the file itself
+            if os.path.getmtime(full_path + extension) >= os.path.getmtime(full_path):
+                return encoding, filename + extension
+        except OSError:
+            continue
+
+    return None
+
+
+def serve_asset(fingerprint, filename):
+    filename = normalize_asset_path(filename)
+
+    # Resolve the path before touching the file, paths leaving the static folder are not found
+    full_path = safe_join(_static_folder, filename)
+    if full_path is None or not os.path.isfile(full_path):
+        abort(404)
+
+    current_fingerprint = get_fingerprint(filename)
+
+    # An outdated fingerprint still gets the file, but it must not be cached forever under that URL
+    immutable = current_fingerprint is not None and fingerprint == current_fingerprint
+    max_age = IMMUTABLE_MAX_AGE_SECONDS if immutable else 0
+
+    variant = get_precompressed_variant(filename, full_path)
+
+    if variant:
+        encoding, variant_filename = variant
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_from_directory(_static_folder, variant_filename, mimetype=mimetype, max_age=max_age)
+        response.headers["Content-Encoding"] = encoding
+    else:
+        response = send_from_directory(_static_folder, filename, max_age=max_age)
+
+    if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add("Accept-Encoding")
+
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+    return response
+
+
+def register_static_assets(app):
+    """Add the /assets route and the asset_url template global to the app."""
+    global _static_folder
+
+    _static_folder = app.static_folder
+    app.add_url_rule("/assets/<fingerprint>/<path:filename>", endpoint="asset", view_func=serve_asset)
+    app.jinja_env.globals["asset_url"] = asset_url
+
+
+def precompress_static_assets(static_folder):
+    """Write .gz (and .br) files for the text assets in the static folder.
+
+    Returns the number of files written.
+    """
+    written = 0
+
+    for directory, _, filenames in os.walk(static_folder):
+        for filename in filenames:
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+
+            full_path = os.path.join(directory, filename)
+            with open(full_path, "rb") as file:
+                content = file.read()
+
+            variants = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append((".br", lambda data: brotli.compress(data, quality=11)))
+
+            for extension, compress in variants:
+                compressed = compress(content)
+
+                # Only keep variants that are actually smaller
+                if len(compressed) >= len(content):
+                    continue
+
+                with open(full_path + extension, "wb") as file:
+                    file.write(compressed)
+                written += 1
+
+    return written
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    print(f"Precompressed {precompress_static_assets(folder)} files in {folder}")
@@ -0,0 +1,140 @@
+"""Query budgets of the main pages on a small synthetic season.
+
+    python -m pytest tests
+
+The pages must stay within their number of SQL statements, so a change that queries per
+user or per match again fails here instead of slowing down the site.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_FOLDER, os.path.join(ROOT_FOLDER, "benchmarks")]
+
+
+RANGLISTE_MAX_QUERIES = 6
+RANGLISTE_CACHED_MAX_QUERIES = 3
+TIPPEN_MAX_QUERIES = 4
+TIPPEN_POST_MAX_QUERIES = 6
+
+
+@pytest.fixture(scope="module")
+def app_module():
+    """The app on a temporary SQLite database with a synthetic season of 30 users"""
+    work_folder = tempfile.mkdtemp(prefix="tippspiel-test-")
+    os.environ.update({
+        "DATABASE_URL": "sqlite:///" + os.path.join(work_folder, "test.sqlite"),
+        "SEASON_CALENDAR_PATH": os.path.join(work_folder, "season_calendar.json"),
+        "LIVE_POLL_ENABLED": "0",
+        "TRACE_FILE": "",
+    })
+
+    # Flask-Session keeps the session files in the working directory of the import
+    previous_folder = os.getcwd()
+    os.chdir(work_folder)
+    try:
+        import app as app_module
+    finally:
+        os.chdir(previous_folder)
+
+    import helpers
+    import synthetic_season
+    from config import get_db_session
+    from database_init import init_database
+
+    init_database()
+    now = datetime.now()
+    synthetic_season.write_season_calendar(os.environ["SEASON_CALENDAR_PATH"], helpers.leagueSeason, now)
+
+    with contextlib.redirect_stdout(io.StringIO()), get_db_session() as db_session:
+        synthetic_season.generate_season(db_session, 30, 40, 36, now)
+        helpers.update_user_scores(db_session, reconcile=True)
+
+    return app_module
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as client_session:
+        client_session["user_id"] = 1
+        client_session["username"] = "player1"
+    return client
+
+
+def request(client, method, path, **kwargs):
+    # The routes print progress messages
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.open(path, method=method, **kwargs)
+
+    assert response.status_code == 200
+    return response
+
+
+def test_rangliste_query_budget(client):
+    from query_stats import assert_max_queries
+    from render_cache import render_cache
+
+    # Loads the reference data snapshot, which isn't part of the page's budget
+    request(client, "GET", "/rangliste")
+    render_cache.clear()
+
+    with assert_max_queries(RANGLISTE_MAX_QUERIES):
+        request(client, "GET", "/rangliste")
+
+    with assert_max_queries(RANGLISTE_CACHED_MAX_QUERIES):
+        request(client, "GET", "/rangliste")
+
+
+def test_tippen_query_budget(client):
+    from query_stats import assert_max_queries
+
+    request(client, "GET", "/tippen")
+
+    with assert_max_queries(TIPPEN_MAX_QUERIES):
+        request(client, "GET", "/tippen")
+
+
+def test_tippen_post_query_budget(client):
+    import helpers
+    from config import get_db_session
+    from query_stats import assert_max_queries
+
+    with client.application.test_request_context():
+        current_round = helpers.get_current_game_round()
+
+    request(client, "GET", f"/tippen?matchday={current_round}")
+    now = datetime.now()
+    start, end = helpers.get_game_rounds()[current_round - 1]
+    with get_db_session() as db_session:
+        open_matches = [match for match in helpers.get_reference_data(db_session).matches
+                        if start <= match.matchDateTime < end and match.matchDateTime > now]
+    assert open_matches
+
+    # One prediction per open match, the budget doesn't depend on their number
+    form = {}
+    for match in open_matches:
+        form[f"team1Score_{match.id}"] = "2"
+        form[f"team2Score_{match.id}"] = "1"
+
+    with assert_max_queries(TIPPEN_POST_MAX_QUERIES):
+        request(client, "POST", "/tippen", data=form)
+
+
+def test_query_stats_headers_only_for_admins(client, monkeypatch):
+    import helpers
+
+    response = request(client, "GET", "/tippen")
+    assert "X-DB-Queries" not in response.headers
+    assert "Server-Timing" not in response.headers
+
+    monkeypatch.setattr(helpers, "ADMIN_USER_IDS", {1})
+    response = request(client, "GET", "/tippen")
+    assert int(response.headers["X-DB-Queries"]) > 0
+    assert response.headers["Server-Timing"].startswith("db;dur=")
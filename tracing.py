@@ -0,0 +1,211 @@
+"""Spans for the update and scoring pipeline.
+
+A span measures one stage, e. g. fetching the matchdata of a league or awarding the
+predictions. Spans opened inside another span become its children, so a sync is recorded
+as a tree that shows which stage was slow:
+
+    with span("award_predictions"):
+        ...
+
+    @traced()
+    def update_matches_and_scores(db_session):
+        ...
+
+Every finished span is appended as one JSON line to TRACE_FILE (default traces.jsonl,
+rotated at TRACE_FILE_MAX_BYTES, empty to disable). The last TRACE_BUFFER_SIZE complete
+traces of this process are kept in memory for the admin page (/admin/traces).
+
+Work handed to a thread pool only stays in the trace if the function is wrapped with
+wrap_context(), since the current span isn't passed to other threads automatically.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 5 * 1024 * 1024))
+TRACE_FILE_BACKUP_COUNT = 3
+TRACE_BUFFER_SIZE = 50
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# The last complete traces (root span plus all descendants), newest last
+_recent_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_recent_traces_lock = threading.Lock()
+
+_trace_logger = None
+_trace_logger_lock = threading.Lock()
+
+
+def new_id():
+    # 16 hex digits, uuid isn't imported just for this
+    return os.urandom(8).hex()
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = new_id()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.trace = parent.trace if parent is not None else Trace()
+        self.span_id = new_id()
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.started_at = datetime.now()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "name": self.name,
+            "start": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def _get_trace_logger():
+    global _trace_logger
+
+    if _trace_logger is None:
+        with _trace_logger_lock:
+            if _trace_logger is None:
+                logger = logging.getLogger("tracing")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES,
+                                              backupCount=TRACE_FILE_BACKUP_COUNT, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+                _trace_logger = logger
+
+    return _trace_logger
+
+
+def _export(span):
+    record = span.to_dict()
+
+    if TRACE_FILE:
+        try:
+            _get_trace_logger().info(json.dumps(record, default=str))
+        except OSError as e:
+            print(f"Could not write trace: {e}")
+
+    span.trace.add((span._start, record))
+
+    if span.parent is None:
+        with _recent_traces_lock:
+            _recent_traces.append((span._start, list(span.trace.spans)))
+
+        print(f"Elapsed time for {span.name}: {span.duration:.4f} seconds")
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, root=True, **attributes):
+    """Measure the block as a child of the current span (or as a new trace).
+
+    With root=False the span is only recorded inside a trace, without a current span the
+    block runs untraced and the yielded span is discarded.
+    """
+    parent = current_span()
+    new_span = Span(name, parent, attributes)
+
+    if parent is None and not root:
+        yield new_span
+        return
+
+    token = _current_span.set(new_span)
+
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.finish()
+        _export(new_span)
+
+
+def traced(name=None):
+    """Decorator that runs the function in a span named after it"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wrap_context(func):
+    """Bind func to the current span, for running it in another thread"""
+    parent = current_span()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_span.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_span.reset(token)
+
+    return wrapper
+
+
+def order_spans(root_start, spans):
+    """Return the span dicts depth-first in start order, with their depth and offset to the root"""
+    children = {}
+    for start, record in sorted(spans, key=lambda item: item[0]):
+        children.setdefault(record["parent_id"], []).append((start, record))
+
+    ordered = []
+
+    def visit(parent_id, depth):
+        for start, record in children.get(parent_id, []):
+            ordered.append(dict(record, depth=depth, offset_ms=round((start - root_start) * 1000, 3)))
+            visit(record["span_id"], depth + 1)
+
+    visit(None, 0)
+    return ordered
+
+
+def get_recent_traces():
+    """The buffered traces, newest first, each as a list of span dicts (root first)"""
+    with _recent_traces_lock:
+        traces = list(_recent_traces)
+
+    return [order_spans(root_start, spans) for root_start, spans in reversed(traces)]
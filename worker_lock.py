@@ -0,0 +1,108 @@
+"""Locks shared by all worker processes.
+
+A WorkerLock can only be held by one process at a time, so work that should run once for
+the whole site (the live poller, a sync) isn't repeated by every worker:
+
+    with try_lock("tippspiel_update") as acquired:
+        if acquired:
+            ...
+
+On MySQL these are named locks (GET_LOCK), held by a connection of their own, so they
+also work across hosts and are released when the holding process dies. Other databases
+(SQLite for the benchmarks) use a lock file in WORKER_LOCK_FOLDER, which only covers the
+processes of one machine.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import text
+from config import get_engine
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+WORKER_LOCK_FOLDER = os.getenv("WORKER_LOCK_FOLDER", tempfile.gettempdir())
+
+
+class WorkerLock:
+    def __init__(self, name):
+        self.name = name
+        self._connection = None
+        self._file = None
+
+    def acquire(self):
+        """Take the lock if no other process holds it, without waiting. Returns whether it is held now."""
+        if self.is_held():
+            return True
+
+        self.release()
+
+        if get_engine().dialect.name == "mysql":
+            # Autocommit, so the connection holding the lock doesn't keep a transaction open
+            connection = get_engine().connect().execution_options(isolation_level="AUTOCOMMIT")
+            try:
+                acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}).scalar() == 1
+            except Exception:
+                connection.close()
+                raise
+
+            if acquired:
+                self._connection = connection
+            else:
+                connection.close()
+            return acquired
+
+        if fcntl is None:
+            # No file locks on this platform, every process counts as the only one
+            self._file = True
+            return True
+
+        lock_file = open(os.path.join(WORKER_LOCK_FOLDER, f"{self.name}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._file = lock_file
+        return True
+
+    def is_held(self):
+        """Whether this process still holds the lock, a lost database connection releases it"""
+        if self._connection is not None:
+            try:
+                return self._connection.execute(
+                    text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), {"name": self.name}
+                ).scalar() == 1
+            except Exception:
+                return False
+
+        return self._file is not None
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+            except Exception:
+                # Never return a connection that may still hold the lock to the pool
+                self._connection.invalidate()
+            self._connection.close()
+            self._connection = None
+
+        if self._file is not None:
+            if self._file is not True:
+                self._file.close()     # Closing the file releases the lock
+            self._file = None
+
+
+@contextmanager
+def try_lock(name):
+    """Yield whether the lock was acquired, release it after the block"""
+    lock = WorkerLock(name)
+    try:
+        yield lock.acquire()
+    finally:
+        lock.release()